@@ -1,185 +1,1335 @@
 import psycopg2
+import psycopg2.pool
+import psycopg2.extensions
+import psycopg2.extras
 import requests
+import requests.adapters
 import configparser
+import atexit
 import base64
+import bisect
+import csv
+import functools
+import gzip
+import hashlib
+import hmac
+import html
+import inspect
+import io
+import itertools
+import json
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import logging
-from flask import Flask, request, render_template_string
-
-# Configure logging to file and console
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[
-        logging.FileHandler('/tmp/app.log'),
-        logging.StreamHandler()
+import logging.handlers
+import queue
+import random
+import re
+import threading
+import time
+from urllib.parse import urlencode
+import click
+from flask import Blueprint, Flask, Response, g, jsonify, request, render_template, stream_template, stream_with_context, url_for
+from jinja2 import ChoiceLoader, DictLoader
+from markupsafe import Markup, escape
+
+# cryptography is only needed for the envelope encryption mode
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
+# Settings. Importing the module only sets the defaults below; create_app()
+# reads config.ini (or another file) on top of them, so the module can be
+# imported from any working directory.
+DEFAULT_CONFIG = 'config.ini'
+config = configparser.ConfigParser()
+
+def load_config(path=None):
+    global VAULT_ADDR, VAULT_TOKEN, VAULT_DB_CREDS_PATH, ENCRYPTION_KEY, VAULT_POOL_SIZE, \
+           VAULT_CONNECT_TIMEOUT, VAULT_READ_TIMEOUT, VAULT_MAX_RETRIES, VAULT_RETRY_BACKOFF, \
+           VAULT_READY_INTERVAL, VAULT_READY_TIMEOUT, DB_HOST, DB_PORT, DB_NAME, DB_POOL_MIN, DB_POOL_MAX, \
+           DB_POOL_TIMEOUT, DB_POOL_HEALTH_CHECK_AFTER, PAGE_SIZE, MAX_PAGE_SIZE, STREAM_FETCH_SIZE, \
+           IMPORT_CHUNK_SIZE, WRITE_BEHIND, WRITE_BEHIND_QUEUE_MAX, WRITE_BEHIND_BATCH_SIZE, \
+           WRITE_BEHIND_INTERVAL, WRITE_BEHIND_RETENTION, WRITE_BEHIND_MAX_ATTEMPTS, DECRYPT_BATCH_SIZE, BLIND_INDEX_KEY, BLIND_INDEX_KEY_VERSION, MASKING, \
+           REWRAP_CHUNK_SIZE, REWRAP_WORKERS, REWRAP_RPS, EXPORT_RPS, DECRYPT_WORKERS, ENCRYPTION_MODE, DATA_KEY_TTL, \
+           DATA_KEY_MAX_USES, DATA_KEY_CACHE_SIZE, DECRYPT_CACHE_ENTRIES, DECRYPT_CACHE_BYTES, \
+           DECRYPT_CACHE_TTL, DECRYPT_KEY_CHECK_INTERVAL, LOG_LEVEL, LOG_FILE, LOG_DEBUG_SAMPLE_INTERVAL, LEASE_REFRESH_FRACTION, \
+           VAULT_CIRCUIT_THRESHOLD, VAULT_CIRCUIT_PROBE_INTERVAL, CREDENTIALS_GRACE, DECRYPT_STALE_GRACE, \
+           MASK_CACHE_ENTRIES, MASK_CACHE_TTL, PAGE_CACHE_ENTRIES, PAGE_CACHE_BYTES, PAGE_CACHE_TTL
+    if path:
+        config.read(path)
+    for section in ('Vault', 'Database'):
+        if not config.has_section(section):
+            config.add_section(section)
+    VAULT_ADDR = config['Vault'].get('vault_addr', fallback='http://127.0.0.1:8200')
+    VAULT_TOKEN = config['Vault'].get('vault_token', fallback='')
+    VAULT_DB_CREDS_PATH = config['Vault'].get('db_path', fallback='mydb/creds/my-role')
+    ENCRYPTION_KEY = config['Vault'].get('encryption_key', fallback='employee-key')
+    VAULT_POOL_SIZE = config['Vault'].getint('pool_size', fallback=10)
+    VAULT_CONNECT_TIMEOUT = config['Vault'].getfloat('connect_timeout', fallback=3.0)
+    VAULT_READ_TIMEOUT = config['Vault'].getfloat('read_timeout', fallback=10.0)
+    VAULT_MAX_RETRIES = config['Vault'].getint('max_retries', fallback=3)
+    VAULT_RETRY_BACKOFF = config['Vault'].getfloat('retry_backoff', fallback=0.2)
+    VAULT_READY_INTERVAL = config['Vault'].getfloat('ready_check_interval', fallback=10.0)
+    VAULT_READY_TIMEOUT = config['Vault'].getfloat('ready_check_timeout', fallback=2.0)
+    VAULT_CIRCUIT_THRESHOLD = config['Vault'].getint('circuit_failure_threshold', fallback=5)
+    VAULT_CIRCUIT_PROBE_INTERVAL = config['Vault'].getfloat('circuit_probe_interval', fallback=5.0)
+    CREDENTIALS_GRACE = config['Vault'].getfloat('credentials_grace', fallback=60.0)
+    DB_HOST = config['Database'].get('host', fallback='localhost')
+    DB_PORT = config['Database'].get('port', fallback='5432')
+    DB_NAME = config['Database'].get('dbname', fallback='postgres')
+    DB_POOL_MIN = config['Database'].getint('pool_min', fallback=1)
+    DB_POOL_MAX = config['Database'].getint('pool_max', fallback=10)
+    DB_POOL_TIMEOUT = config['Database'].getfloat('pool_timeout', fallback=5.0)
+    DB_POOL_HEALTH_CHECK_AFTER = config['Database'].getfloat('pool_health_check_after', fallback=30.0)
+    PAGE_SIZE = config['Database'].getint('page_size', fallback=100)
+    MAX_PAGE_SIZE = config['Database'].getint('max_page_size', fallback=1000)
+    STREAM_FETCH_SIZE = config['Database'].getint('stream_fetch_size', fallback=500)
+    IMPORT_CHUNK_SIZE = config['Database'].getint('import_chunk_size', fallback=500)
+    WRITE_BEHIND = config.getboolean('WriteBehind', 'enabled', fallback=False)
+    WRITE_BEHIND_QUEUE_MAX = config.getint('WriteBehind', 'queue_max', fallback=10000)
+    WRITE_BEHIND_BATCH_SIZE = config.getint('WriteBehind', 'batch_size', fallback=100)
+    WRITE_BEHIND_INTERVAL = config.getfloat('WriteBehind', 'interval', fallback=0.5)
+    WRITE_BEHIND_RETENTION = config.getint('WriteBehind', 'retention_hours', fallback=24)
+    WRITE_BEHIND_MAX_ATTEMPTS = config.getint('WriteBehind', 'max_attempts', fallback=3)
+    DECRYPT_BATCH_SIZE = config['Vault'].getint('decrypt_batch_size', fallback=250)
+    BLIND_INDEX_KEY = config['Vault'].get('blind_index_key', fallback='employee-bidx')
+    BLIND_INDEX_KEY_VERSION = config['Vault'].getint('blind_index_key_version', fallback=1)
+    MASKING = config['Vault'].getboolean('masking', fallback=False)
+    REWRAP_CHUNK_SIZE = config['Vault'].getint('rewrap_chunk_size', fallback=500)
+    REWRAP_WORKERS = config['Vault'].getint('rewrap_workers', fallback=4)
+    REWRAP_RPS = config['Vault'].getfloat('rewrap_rps', fallback=20.0)
+    EXPORT_RPS = config['Vault'].getfloat('export_rps', fallback=20.0)
+    DECRYPT_WORKERS = config['Vault'].getint('decrypt_workers', fallback=4)
+    ENCRYPTION_MODE = config['Vault'].get('encryption_mode', fallback='transit')
+    DATA_KEY_TTL = config['Vault'].getfloat('data_key_ttl', fallback=3600.0)
+    DATA_KEY_MAX_USES = config['Vault'].getint('data_key_max_uses', fallback=100000)
+    DATA_KEY_CACHE_SIZE = config['Vault'].getint('data_key_cache_size', fallback=128)
+    DECRYPT_CACHE_ENTRIES = config.getint('Cache', 'decrypt_entries', fallback=10000)
+    DECRYPT_CACHE_BYTES = config.getint('Cache', 'decrypt_bytes', fallback=16 * 1024 * 1024)
+    DECRYPT_CACHE_TTL = config.getfloat('Cache', 'decrypt_ttl', fallback=300.0)
+    DECRYPT_STALE_GRACE = config.getfloat('Cache', 'decrypt_stale_grace', fallback=600.0)
+    DECRYPT_KEY_CHECK_INTERVAL = config.getfloat('Cache', 'decrypt_key_check_interval', fallback=60.0)
+    MASK_CACHE_ENTRIES = config.getint('Cache', 'mask_entries', fallback=10000)
+    MASK_CACHE_TTL = config.getfloat('Cache', 'mask_ttl', fallback=3600.0)
+    PAGE_CACHE_ENTRIES = config.getint('Cache', 'page_entries', fallback=100)
+    PAGE_CACHE_BYTES = config.getint('Cache', 'page_bytes', fallback=32 * 1024 * 1024)
+    PAGE_CACHE_TTL = config.getfloat('Cache', 'page_ttl', fallback=300.0)
+    LOG_LEVEL = config.get('Logging', 'level', fallback='INFO')
+    LOG_FILE = config.get('Logging', 'file', fallback='/tmp/app.log')
+    LOG_DEBUG_SAMPLE_INTERVAL = config.getfloat('Logging', 'debug_sample_interval', fallback=1.0)
+    LEASE_REFRESH_FRACTION = config['Vault'].getfloat('lease_refresh_fraction', fallback=0.67)
+
+load_config()
+
+# Columns of the employees table that hold Transit or envelope ciphertext
+ENCRYPTED_COLUMNS = ('email', 'phone_number', 'ssn', 'address')
+
+# Masks secrets and PII in log messages before they are written anywhere
+class RedactingFilter(logging.Filter):
+    PATTERNS = [
+        (re.compile(r'(vault:v\d+:)[A-Za-z0-9+/=]+'), r'\1[redacted]'),
+        (re.compile(r'(env:v\d+:\d+:)[A-Za-z0-9+/=]+'), r'\1[redacted]'),
+        (re.compile(r'\bhv[sbr]\.[A-Za-z0-9_-]+'), '[redacted-token]'),
+        (re.compile(r'(password|token)(["\']?\s*[:=]\s*["\']?)[^\s"\',}]+', re.IGNORECASE), r'\1\2[redacted]'),
+        (re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+'), '[redacted-email]'),
+        (re.compile(r'\b\d{3}-\d{2}-\d{4}\b|\b\d{9}\b'), '[redacted-ssn]'),
+        (re.compile(r'(?:\(\d{3}\)\s?|\b\d{3}[-. ]?)\d{3}[-. ]?\d{4}\b'), '[redacted-phone]'),
     ]
-)
+
+    def redact(self, text):
+        for pattern, replacement in self.PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text
+
+    def filter(self, record):
+        record.msg = self.redact(record.getMessage())
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = self.redact(record.exc_text)
+        record.exc_info = None
+        return True
+
+# Route all logging through a QueueHandler so request threads only enqueue records;
+# a QueueListener thread redacts them and does the file/console writes.
+log_listener = None
+
+def configure_logging(level=LOG_LEVEL, path=LOG_FILE):
+    global log_listener
+    stop_logging()
+    redactor = RedactingFilter()
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+    handlers = [logging.StreamHandler()]
+    if path:
+        handlers.insert(0, logging.FileHandler(path))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(redactor)
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper())
+    log_listener.start()
+    return log_listener
+
+# Flush queued records and stop the listener thread
+def stop_logging():
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        for handler in log_listener.handlers:
+            handler.close()
+        log_listener = None
+
+atexit.register(stop_logging)
 logger = logging.getLogger(__name__)
 
-# Load config
-config = configparser.ConfigParser()
-config.read('config.ini')
-VAULT_ADDR = config['Vault']['vault_addr']
-VAULT_TOKEN = config['Vault']['vault_token']
-VAULT_DB_CREDS_PATH = config['Vault']['db_path']
-ENCRYPTION_KEY = config['Vault']['encryption_key']
-DB_HOST = config['Database']['host']
-DB_PORT = config['Database']['port']
-DB_NAME = config['Database']['dbname']
-
-# Test Vault connectivity
-try:
-    response = requests.get(f"{VAULT_ADDR}/v1/sys/health", headers={'X-Vault-Token': VAULT_TOKEN})
-    logger.info(f"Vault health check: {response.status_code}")
-except Exception as e:
-    logger.error(f"Vault connectivity test failed: {str(e)}")
+# Lets hot loops emit at most one debug message per key and interval; the next
+# message that gets through reports how many were suppressed in between
+class SampledLogger:
+    def __init__(self, logger, interval=LOG_DEBUG_SAMPLE_INTERVAL):
+        self.logger = logger
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
 
-# Fetch dynamic DB credentials from Vault
-def get_db_credentials():
+    def debug(self, key, msg, *args):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(key, -self.interval) < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            msg = f"{msg} ({suppressed} similar messages suppressed)"
+        self.logger.debug(msg, *args)
+
+sampled_logger = SampledLogger(logger)
+
+# Columns shown in the employee views (the blind index columns stay internal)
+EMPLOYEE_COLUMNS = ('id', 'name', 'role', 'email', 'phone_number', 'ssn', 'address')
+EMPLOYEE_SELECT = f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM employees"
+
+# Columns named by a ?fields=name,role projection, in table order. id is always
+# included because pagination keys on it. Unknown names raise ValueError.
+def parse_fields(value):
+    if not value:
+        return EMPLOYEE_COLUMNS
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested.difference(EMPLOYEE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(column for column in EMPLOYEE_COLUMNS if column == 'id' or column in requested)
+
+# SELECT for a projection from parse_fields(); the names are whitelisted there
+def employee_select(fields=EMPLOYEE_COLUMNS):
+    return f"SELECT {', '.join(fields)} FROM employees"
+
+# Prefix of values encrypted locally with a Transit data key: env:v1:<key id>:<nonce+ciphertext>
+ENVELOPE_PREFIX = 'env:v1:'
+
+# Prefix of Transit ciphertexts under any key version: vault:v<version>:
+TRANSIT_PREFIX = re.compile(r'vault:v(\d+):')
+
+# Latency buckets (seconds) shared by every histogram
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+# Prometheus-style counter with optional labels
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(label, '') for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+# Prometheus-style histogram with fixed buckets and optional labels
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=METRIC_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(label, '') for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {entry[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {entry[-1]}")
+        return lines
+
+VAULT_REQUEST_SECONDS = Histogram('vault_request_seconds', 'Latency of Vault operations.', ('operation',))
+VAULT_ERRORS = Counter('vault_errors_total', 'Failed Vault operations.', ('operation',))
+DB_CHECKOUT_SECONDS = Histogram('db_checkout_seconds', 'Time to check a connection out of the pool.')
+DB_QUERY_SECONDS = Histogram('db_query_seconds', 'Time spent executing database statements.')
+DB_ERRORS = Counter('db_errors_total', 'Failed database statements and checkouts.', ('stage',))
+HTTP_REQUEST_SECONDS = Histogram('http_request_seconds', 'Time to build a response, including rendering.', ('endpoint', 'status'))
+ROWS_SERVED = Counter('employee_rows_served_total', 'Employee rows returned by each view.', ('view',))
+FIELDS_REVEALED = Counter('employee_fields_revealed_total', 'Single encrypted fields decrypted on demand.', ('field',))
+VAULT_COALESCED = Counter('vault_coalesced_total', 'Vault lookups that joined an identical call already in flight.', ('operation',))
+VAULT_STALE_SERVED = Counter('vault_stale_served_total', 'Expired credentials or plaintexts served while Vault was failing.', ('kind',))
+
+# Times every call of the wrapped Vault helper (sync or async) and counts its failures
+def observe_vault(operation):
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    VAULT_ERRORS.inc(operation=operation)
+                    raise
+                finally:
+                    VAULT_REQUEST_SECONDS.observe(time.perf_counter() - start, operation=operation)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                VAULT_ERRORS.inc(operation=operation)
+                raise
+            finally:
+                VAULT_REQUEST_SECONDS.observe(time.perf_counter() - start, operation=operation)
+        return wrapper
+    return decorator
+
+# Cursor that records how long each statement takes
+class TimedCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except Exception:
+            DB_ERRORS.inc(stage='query')
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start)
+
+# True for values stored as Transit or envelope ciphertext
+def is_encrypted(value):
+    return isinstance(value, str) and (value.startswith('vault:') or value.startswith(ENVELOPE_PREFIX))
+
+# Collapses identical concurrent calls: the first caller for a key (the leader)
+# does the work and every caller that arrives while it is in flight waits for
+# and shares its result or exception.
+class SingleFlight:
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.value = None
+            self.error = None
+
+        def wait(self, timeout=None):
+            if not self.done.wait(timeout):
+                raise TimeoutError("timed out waiting for an in-flight Vault call")
+            if self.error is not None:
+                raise self.error
+            return self.value
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    # Returns (keys this caller now leads, {key: Call} for keys already in flight).
+    # The leader must resolve() every key it was given.
+    def claim(self, keys):
+        owned, joined = [], {}
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    self._calls[key] = SingleFlight.Call()
+                    owned.append(key)
+                else:
+                    joined[key] = call
+        if joined:
+            VAULT_COALESCED.inc(len(joined), operation=self.name)
+        return owned, joined
+
+    def resolve(self, key, value=None, error=None):
+        with self._lock:
+            call = self._calls.pop(key)
+        call.value, call.error = value, error
+        call.done.set()
+
+    def do(self, key, func, timeout=None):
+        owned, joined = self.claim([key])
+        if joined:
+            return joined[key].wait(timeout)
+        try:
+            value = func()
+        except Exception as e:
+            self.resolve(key, error=e)
+            raise
+        self.resolve(key, value)
+        return value
+
+# Raised without contacting Vault while the circuit breaker is open
+class VaultUnavailableError(requests.ConnectionError):
+    pass
+
+# Opens after `threshold` consecutive failed Vault requests so callers fail
+# fast instead of piling onto a struggling Vault. While open, a timer probes
+# sys/health every probe_interval seconds and closes the circuit once Vault
+# answers again.
+class CircuitBreaker:
+    def __init__(self, probe, threshold=VAULT_CIRCUIT_THRESHOLD, probe_interval=VAULT_CIRCUIT_PROBE_INTERVAL):
+        self.probe = probe
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.failures = 0
+        self.opened_at = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is None and self.threshold and self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                logger.error(f"Vault circuit opened after {self.failures} consecutive failures")
+                self._schedule()
+
+    def _schedule(self):
+        self._timer = threading.Timer(self.probe_interval, self._probe)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _probe(self):
+        try:
+            healthy = self.probe()
+        except Exception as e:
+            logger.warning(f"Vault probe failed: {str(e)}")
+            healthy = False
+        with self._lock:
+            if healthy:
+                logger.info(f"Vault circuit closed after {time.monotonic() - self.opened_at:.1f}s")
+                self.opened_at = None
+                self.failures = 0
+            else:
+                self._schedule()
+
+# Shared Vault HTTP client. Keeps a pooled keep-alive requests.Session so hot paths
+# reuse warm connections, applies connect/read timeouts, and retries 429/5xx
+# responses and connection errors with exponential backoff and jitter.
+class VaultClient:
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, addr, token, pool_size=VAULT_POOL_SIZE,
+                 connect_timeout=VAULT_CONNECT_TIMEOUT, read_timeout=VAULT_READ_TIMEOUT,
+                 max_retries=VAULT_MAX_RETRIES, retry_backoff=VAULT_RETRY_BACKOFF,
+                 circuit_threshold=VAULT_CIRCUIT_THRESHOLD, probe_interval=VAULT_CIRCUIT_PROBE_INTERVAL):
+        self.addr = addr.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker(self._probe, circuit_threshold, probe_interval)
+        self.session = requests.Session()
+        self.session.headers.update({
+            'X-Vault-Token': token,
+            'Content-Type': 'application/json'
+        })
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _backoff(self, attempt):
+        return self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _probe(self):
+        response = self.session.get(f"{self.addr}/v1/sys/health", timeout=self.timeout)
+        return response.status_code not in self.RETRY_STATUSES
+
+    def request(self, method, path, retries=None, **kwargs):
+        if self.breaker.is_open:
+            raise VaultUnavailableError(f"Vault circuit is open, not sending {method} {path}")
+        retries = self.max_retries if retries is None else retries
+        url = f"{self.addr}/v1/{path.lstrip('/')}"
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == retries:
+                    self.breaker.record_failure()
+                    raise
+                logger.warning(f"Vault {method} {path} failed ({str(e)}), retrying")
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                if attempt == retries:
+                    self.breaker.record_failure()
+                    return response
+                logger.warning(f"Vault {method} {path} returned {response.status_code}, retrying")
+            time.sleep(self._backoff(attempt))
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+# Token bucket limiting callers to `rate` operations per second (with bursts up to `burst`)
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+# Vault readiness without blocking startup or requests. Each check runs on a
+# short-lived thread with its own timeout; status() returns the last result and
+# starts a new check once that result is older than the interval.
+class ReadinessCheck:
+    def __init__(self, interval=VAULT_READY_INTERVAL, timeout=VAULT_READY_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self._result = {'ready': False, 'vault': 'pending'}
+        self._checked_at = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _check(self):
+        try:
+            response = vault_client.get("sys/health", retries=0, timeout=self.timeout)
+            # 200 active, 429 unsealed standby, 473 performance standby
+            ready = response.status_code in (200, 429, 473)
+            result = {'ready': ready, 'vault': response.status_code}
+            logger.info(f"Vault health check: {response.status_code}")
+        except Exception as e:
+            result = {'ready': False, 'vault': 'unreachable', 'error': str(e)}
+            logger.error(f"Vault connectivity test failed: {str(e)}")
+        with self._lock:
+            self._result = result
+            self._checked_at = time.monotonic()
+            self._running = False
+
+    # Start a background check unless one is running or the last one is fresh
+    def refresh(self, force=False):
+        with self._lock:
+            fresh = self._checked_at is not None and time.monotonic() - self._checked_at < self.interval
+            if self._running or (fresh and not force):
+                return
+            self._running = True
+        threading.Thread(target=self._check, name='vault-readiness', daemon=True).start()
+
+    def status(self):
+        self.refresh()
+        with self._lock:
+            result = dict(self._result)
+            if self._checked_at is not None:
+                result['age'] = round(time.monotonic() - self._checked_at, 3)
+            return result
+
+# Fetch a fresh set of dynamic DB credentials (and their lease) from Vault
+@observe_vault('credentials')
+def fetch_db_credentials():
     logger.debug(f"Fetching credentials from {VAULT_ADDR}/v1/{VAULT_DB_CREDS_PATH}")
     try:
-        url = f"{VAULT_ADDR}/v1/{VAULT_DB_CREDS_PATH}"
-        headers = {'X-Vault-Token': VAULT_TOKEN}
-        response = requests.get(url, headers=headers)
+        response = vault_client.get(VAULT_DB_CREDS_PATH)
         response.raise_for_status()
         data = response.json()
-        logger.debug(f"Credentials fetched: {data['data']['username']}")
-        return data['data']['username'], data['data']['password']
+        logger.debug(f"Credentials fetched: {data['data']['username']} (lease {data.get('lease_id')}, ttl {data.get('lease_duration')}s)")
+        return {
+            'username': data['data']['username'],
+            'password': data['data']['password'],
+            'lease_id': data.get('lease_id'),
+            'lease_duration': data.get('lease_duration') or 0,
+            'renewable': data.get('renewable', False),
+        }
     except Exception as e:
         logger.error(f"Failed to fetch DB credentials: {str(e)}")
         raise
 
+# Renew a credentials lease; returns the new lease duration in seconds
+@observe_vault('lease_renew')
+def renew_db_lease(lease_id, increment):
+    logger.debug(f"Renewing lease {lease_id}")
+    try:
+        payload = {'lease_id': lease_id, 'increment': increment}
+        response = vault_client.put("sys/leases/renew", json=payload)
+        response.raise_for_status()
+        lease_duration = response.json().get('lease_duration') or 0
+        logger.debug(f"Lease {lease_id} renewed for {lease_duration}s")
+        return lease_duration
+    except Exception as e:
+        logger.error(f"Lease renewal failed for {lease_id}: {str(e)}")
+        raise
+
+# Caches the dynamic DB credentials for the lifetime of their Vault lease.
+# Once refresh_fraction of the TTL has passed the lease is renewed (or new
+# credentials issued) on a background thread while callers keep using the
+# current credentials. Callers only block when there are no usable credentials.
+class DbCredentialManager:
+    def __init__(self, refresh_fraction=LEASE_REFRESH_FRACTION, grace=CREDENTIALS_GRACE):
+        self.refresh_fraction = refresh_fraction
+        self.grace = grace
+        self.generation = 0  # bumped whenever a new username/password is issued
+        self._creds = None
+        self._issued_at = 0.0
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._issue_lock = threading.Lock()
+        self._refreshing = False
+
+    def _store(self, creds, now):
+        ttl = creds['lease_duration']
+        self._creds = creds
+        self._issued_at = now
+        self._refresh_at = now + ttl * self.refresh_fraction if ttl else float('inf')
+        self._expires_at = now + ttl if ttl else float('inf')
+
+    def _issue(self):
+        # A background refresh and a foreground issue share one Vault call
+        creds = credential_flights.do(VAULT_DB_CREDS_PATH, fetch_db_credentials)
+        with self._lock:
+            if self._creds is not None and creds['lease_id'] and creds['lease_id'] == self._creds['lease_id']:
+                return
+            self.generation += 1
+            self._store(dict(creds, generation=self.generation), time.monotonic())
+            logger.info(f"Issued DB credentials generation {self.generation} for {creds['username']}")
+
+    def _refresh(self):
+        try:
+            creds = self._creds
+            if creds and creds['renewable'] and creds['lease_id']:
+                try:
+                    ttl = renew_db_lease(creds['lease_id'], creds['lease_duration'])
+                    # A lease capped by max_ttl comes back shorter than asked; replace it instead
+                    if ttl >= creds['lease_duration'] * (1 - self.refresh_fraction):
+                        with self._lock:
+                            self._store(dict(creds, lease_duration=ttl), time.monotonic())
+                        return
+                except Exception:
+                    pass
+            self._issue()
+        except Exception as e:
+            logger.error(f"Background credential refresh failed: {str(e)}")
+            # Retry in a few seconds rather than on the very next request
+            with self._lock:
+                self._refresh_at = min(time.monotonic() + 5.0, self._expires_at)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    # Returns the cached credentials dict, including the generation it belongs to
+    def get_lease(self):
+        now = time.monotonic()
+        with self._lock:
+            creds = self._creds
+            usable = creds is not None and now < self._expires_at
+            if usable and now >= self._refresh_at and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, name='db-credential-refresh', daemon=True).start()
+        if usable:
+            return creds
+        # Only one caller issues new credentials; the others wait and reuse them
+        with self._issue_lock:
+            now = time.monotonic()
+            if self._creds is None or (now >= self._expires_at and now >= self._retry_at):
+                try:
+                    self._issue()
+                except Exception:
+                    # While Vault is failing, keep handing out the expired lease for up to
+                    # `grace` seconds (pooled connections opened with it keep working) and
+                    # only retry the issue every few seconds
+                    if self._creds is None or now >= self._expires_at + self.grace:
+                        raise
+                    self._retry_at = min(now + 5.0, self._expires_at + self.grace)
+                    logger.warning(f"Serving expired DB credentials generation {self.generation} while Vault is unavailable")
+            if self._creds is not None and now >= self._expires_at:
+                VAULT_STALE_SERVED.inc(kind='credentials')
+            return self._creds
+
+    def get(self):
+        creds = self.get_lease()
+        return creds['username'], creds['password']
+
+# Fetch dynamic DB credentials, reusing the cached lease while it is valid
+def get_db_credentials():
+    return credential_manager.get()
+
 # Encrypt using Vault transit
+@observe_vault('encrypt')
 def vault_encrypt(plaintext):
-    logger.debug(f"Encrypting data with key {ENCRYPTION_KEY}: {plaintext}")
+    sampled_logger.debug('encrypt', "Encrypting data with key %s", ENCRYPTION_KEY)
     try:
-        url = f"{VAULT_ADDR}/v1/transit/encrypt/{ENCRYPTION_KEY}"
-        headers = {
-            'X-Vault-Token': VAULT_TOKEN,
-            'Content-Type': 'application/json'
-        }
         b64_encoded = base64.b64encode(plaintext.encode('utf-8')).decode('utf-8')
         payload = {'plaintext': b64_encoded}
-        response = requests.post(url, headers=headers, json=payload)
+        response = vault_client.post(f"transit/encrypt/{ENCRYPTION_KEY}", json=payload)
         response.raise_for_status()
         ciphertext = response.json()['data']['ciphertext']
-        logger.debug(f"Encrypted data: {ciphertext}")
         return ciphertext
     except Exception as e:
-        logger.error(f"Encryption failed for '{plaintext}': {str(e)}")
+        logger.error(f"Encryption failed: {str(e)}")
         raise
 
-# Decrypt using Vault transit
-def vault_decrypt(ciphertext):
-    logger.debug(f"Decrypting data: {ciphertext}")
+# Raised when one or more items of a Transit batch request fail
+class VaultBatchError(Exception):
+    def __init__(self, message, results, errors):
+        super().__init__(message)
+        self.results = results  # per-item results, None where the item failed
+        self.errors = errors    # {index: error message} for the failed items
+
+# Send a Transit request with batch_input and parse each item of batch_results.
+# Per-item failures are collected into a VaultBatchError carrying the partial results.
+def transit_batch(path, batch_input, parse, action):
+    if not batch_input:
+        return []
+    sampled_logger.debug(path, "Batch %s of %d values via %s", action, len(batch_input), path)
     try:
-        url = f"{VAULT_ADDR}/v1/transit/decrypt/{ENCRYPTION_KEY}"
-        headers = {
-            'X-Vault-Token': VAULT_TOKEN,
-            'Content-Type': 'application/json'
-        }
-        payload = {'ciphertext': ciphertext}
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        plaintext_b64 = response.json()['data']['plaintext']
-        plaintext = base64.b64decode(plaintext_b64).decode('utf-8')
-        logger.debug(f"Decrypted data: {plaintext}")
-        return plaintext
+        response = vault_client.post(path, json={'batch_input': batch_input})
     except Exception as e:
-        logger.error(f"Decryption failed for '{ciphertext}': {str(e)}")
+        logger.error(f"Batch {action} failed: {str(e)}")
         raise
+    return parse_batch_results(response, batch_input, parse, action)
 
-# Encode (mask) SSN using Vault Transform (retained but unused for now)
-def vault_transform_encode_ssn(ssn_value):
-    logger.debug(f"Encoding SSN: {ssn_value}")
+# Parse the batch_results of a Transit or Transform batch response (from requests
+# or httpx). Per-item failures are collected into a VaultBatchError as above.
+def parse_batch_results(response, batch_input, parse, action):
     try:
-        url = f"{VAULT_ADDR}/v1/transform/encode/masking-role"
-        headers = {
-            'X-Vault-Token': VAULT_TOKEN,
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            "value": ssn_value,
-            "transformation": "ssn-fpe"
-        }
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        encoded_value = response.json()['data']['encoded_value']
-        logger.debug(f"Encoded SSN: {encoded_value}")
-        return encoded_value
+        # Vault answers 400 when some batch items fail; the per-item errors are in the body
+        if response.status_code != 400:
+            response.raise_for_status()
+        body = response.json()
+        if 'data' not in body:
+            response.raise_for_status()
+        batch_results = body['data']['batch_results']
     except Exception as e:
-        logger.error(f"SSN encoding failed: {str(e)}")
+        logger.error(f"Batch {action} failed: {str(e)}")
         raise
 
-# Decode (unmask) SSN using Vault Transform (retained but unused for now)
-def vault_transform_decode_ssn(encoded_value):
-    logger.debug(f"Decoding SSN: {encoded_value}")
+    if len(batch_results) != len(batch_input):
+        raise VaultBatchError(
+            f"Vault returned {len(batch_results)} results for {len(batch_input)} inputs",
+            [None] * len(batch_input), {}
+        )
+    results = []
+    errors = {}
+    for index, item in enumerate(batch_results):
+        try:
+            if item.get('error'):
+                raise ValueError(item['error'])
+            results.append(parse(item))
+        except Exception as e:
+            errors[index] = str(e)
+            results.append(None)
+    if errors:
+        for index, error in errors.items():
+            logger.error(f"Batch {action} failed for item {index}: {error}")
+        raise VaultBatchError(f"Batch {action} failed for {len(errors)} of {len(batch_input)} items", results, errors)
+    return results
+
+# Encrypt several values in one Vault transit call using batch_input
+@observe_vault('encrypt')
+def vault_encrypt_many(values):
+    batch_input = [
+        {'plaintext': base64.b64encode(value.encode('utf-8')).decode('utf-8')}
+        for value in values
+    ]
+    return transit_batch(f"transit/encrypt/{ENCRYPTION_KEY}", batch_input,
+                         lambda item: item['ciphertext'], 'encryption')
+
+# Rewrap several ciphertexts to the latest key version in one Vault transit call
+@observe_vault('rewrap')
+def vault_rewrap_many(ciphertexts):
+    batch_input = [{'ciphertext': ciphertext} for ciphertext in ciphertexts]
+    return transit_batch(f"transit/rewrap/{ENCRYPTION_KEY}", batch_input,
+                         lambda item: item['ciphertext'], 'rewrap')
+
+# Metadata of the Transit encryption key (latest_version, min_decryption_version, ...)
+@observe_vault('key_read')
+def vault_read_key():
     try:
-        url = f"{VAULT_ADDR}/v1/transform/decode/masking-role/last-four"
-        headers = {
-            'X-Vault-Token': VAULT_TOKEN,
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            "value": encoded_value,
-            "transformation": "ssn-fpe"
-        }
-        response = requests.post(url, headers=headers, json=payload)
+        response = vault_client.get(f"transit/keys/{ENCRYPTION_KEY}")
         response.raise_for_status()
-        decoded_value = response.json()['data']['decoded_value']
-        logger.debug(f"Decoded SSN: {decoded_value}")
-        return decoded_value
+        return response.json()['data']
     except Exception as e:
-        logger.error(f"SSN decoding failed: {str(e)}")
+        logger.error(f"Failed to read key {ENCRYPTION_KEY}: {str(e)}")
         raise
 
-# Encode (mask) phone number using Vault Transform (retained but unused for now)
-def vault_transform_encode_phone(phone_value):
-    logger.debug(f"Encoding phone number: {phone_value}")
+# Latest version of the Transit encryption key
+def vault_key_latest_version():
+    return vault_read_key()['latest_version']
+
+# HMAC of one value under a pinned version of a Transit key, as raw bytes
+@observe_vault('hmac')
+def vault_hmac(value, key, key_version):
     try:
-        url = f"{VAULT_ADDR}/v1/transform/encode/masking-role"
-        headers = {
-            'X-Vault-Token': VAULT_TOKEN,
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            "value": phone_value,
-            "transformation": "phone-fpe"
-        }
-        response = requests.post(url, headers=headers, json=payload)
+        response = vault_client.post(f"transit/hmac/{key}/sha2-256", json={
+            'input': base64.b64encode(value.encode('utf-8')).decode('utf-8'),
+            'key_version': key_version,
+        })
         response.raise_for_status()
-        encoded_value = response.json()['data']['encoded_value']
-        logger.debug(f"Encoded phone number: {encoded_value}")
-        return encoded_value
+        return base64.b64decode(response.json()['data']['hmac'].split(':', 2)[2])
     except Exception as e:
-        logger.error(f"Phone number encoding failed: {str(e)}")
+        logger.error(f"HMAC with key {key} failed: {str(e)}")
         raise
 
-# Decode (unmask) phone number using Vault Transform (retained but unused for now)
+# Key for the blind indexes: the Transit HMAC of a fixed label under the
+# BLIND_INDEX_KEY key at the pinned blind_index_key_version. Every process derives
+# the same key with one Vault call and computes indexes locally from then on.
+# Rotating the Transit key leaves it unchanged; changing the pinned version
+# changes every index, so it needs a full `backfill-blind-index --all`.
+class BlindIndexKey:
+    LABEL = 'employees/blind-index'
+
+    def __init__(self, key=BLIND_INDEX_KEY, version=BLIND_INDEX_KEY_VERSION):
+        self.key = key
+        self.version = version
+        self._secret = None
+        self._lock = threading.Lock()
+
+    def ready(self):
+        return self._secret is not None
+
+    def get(self):
+        if self._secret is None:
+            with self._lock:
+                if self._secret is None:
+                    self._secret = vault_hmac(self.LABEL, self.key, self.version)
+        return self._secret
+
+# Canonical forms used for blind indexes, so lookups ignore case and formatting
+def normalize_email(email):
+    return email.strip().lower()
+
+def normalize_ssn(ssn):
+    return ''.join(ch for ch in ssn if ch.isdigit())
+
+# Blind index values (hex HMAC-SHA256 digests) of 'email:...'/'ssn:...' lookup values
+def blind_index_many(values):
+    secret = blind_index_key.get()
+    return [hmac.new(secret, value.encode('utf-8'), hashlib.sha256).hexdigest() for value in values]
+
+# Blind index values for (email, ssn) pairs
+def blind_indexes(pairs):
+    pairs = list(pairs)
+    values = []
+    for email, ssn in pairs:
+        values.append('email:' + normalize_email(email))
+        values.append('ssn:' + normalize_ssn(ssn))
+    digests = blind_index_many(values)
+    return [(digests[i * 2], digests[i * 2 + 1]) for i in range(len(pairs))]
+
+# Thread-safe LRU cache whose entries expire after ttl seconds. Bounded by entry
+# count and, optionally, by a byte budget measured with `sizer`.
+class TTLCache:
+    def __init__(self, max_entries, ttl, max_bytes=None, sizer=None, grace=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.grace = grace  # expired entries are kept this long for get_stale()
+        self.max_bytes = max_bytes
+        self.sizer = sizer or (lambda key, value: len(str(key)) + len(value))
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            now = time.monotonic()
+            if entry[0] <= now:
+                if entry[0] + self.grace <= now:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    # An entry that has expired less than `grace` seconds ago, for use when the
+    # source of truth is unavailable
+    def get_stale(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + self.grace <= time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        size = self.sizer(key, value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    # Drop every entry whose key matches predicate; returns the number removed
+    def invalidate(self, predicate):
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+# Drop cached plaintexts after a key rotation. With min_version, only values
+# encrypted under older key versions are dropped; otherwise the cache is cleared.
+def invalidate_decrypt_cache(min_version=None):
+    if min_version is None:
+        decrypt_cache.clear()
+        logger.info("Decrypt cache cleared")
+        return
+    def older(ciphertext):
+        match = TRANSIT_PREFIX.match(ciphertext)
+        return match is None or int(match.group(1)) < min_version
+    removed = decrypt_cache.invalidate(older)
+    logger.info(f"Dropped {removed} cached plaintexts below key version {min_version}")
+
+# Watches min_decryption_version of the Transit key and invalidates the decrypt
+# cache when it is raised, so plaintexts of ciphertexts under retired key versions
+# stop being served. Like ReadinessCheck, refresh() is called from the decrypt
+# path and starts a check on a short-lived thread once the last one is older
+# than the interval; it never waits on Vault itself.
+class KeyVersionCheck:
+    def __init__(self, interval=DECRYPT_KEY_CHECK_INTERVAL):
+        self.interval = interval
+        self.min_version = 1
+        self._checked_at = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _check(self):
+        try:
+            min_version = vault_read_key().get('min_decryption_version') or 1
+            with self._lock:
+                raised = min_version > self.min_version
+                self.min_version = max(self.min_version, min_version)
+            if raised:
+                invalidate_decrypt_cache(min_version)
+        except Exception as e:
+            logger.warning(f"Key version check failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._checked_at = time.monotonic()
+                self._running = False
+
+    def refresh(self):
+        with self._lock:
+            fresh = self._checked_at is not None and time.monotonic() - self._checked_at < self.interval
+            if self._running or fresh or not self.interval:
+                return
+            self._running = True
+        threading.Thread(target=self._check, name='key-version-check', daemon=True).start()
+
+# Decrypt using Vault transit (served from decrypt_cache when possible)
+def vault_decrypt(ciphertext):
+    return vault_decrypt_many([ciphertext])[0]
+
+# Decrypt several ciphertexts, serving what it can from decrypt_cache and
+# sending the remaining distinct ciphertexts in one Vault batch call.
+# With raw=True the plaintexts are returned as bytes and never cached.
+def vault_decrypt_many(ciphertexts, raw=False):
+    ciphertexts = list(ciphertexts)
+    if raw:
+        return _vault_decrypt_batch(ciphertexts, raw=True)
+    key_version_check.refresh()
+    plaintexts = [decrypt_cache.get(ciphertext) for ciphertext in ciphertexts]
+    misses = list(dict.fromkeys(c for c, p in zip(ciphertexts, plaintexts) if p is None))
+    if not misses:
+        return plaintexts
+    # Ciphertexts another request is already decrypting are waited for, not re-sent
+    owned, joined = decrypt_flights.claim(misses)
+    resolved = {}
+    failed = set()
+    stale = False
+    try:
+        fetched = _vault_decrypt_batch(owned) if owned else []
+    except VaultBatchError as e:
+        fetched = e.results
+    except Exception as e:
+        # Vault is down: fall back to recently expired plaintexts within the grace window
+        fetched = [decrypt_cache.get_stale(ciphertext) for ciphertext in owned]
+        served = sum(1 for plaintext in fetched if plaintext is not None)
+        if not served:
+            for ciphertext in owned:
+                decrypt_flights.resolve(ciphertext, error=e)
+            raise
+        stale = True
+        VAULT_STALE_SERVED.inc(served, kind='plaintext')
+        logger.warning(f"Serving {served} stale plaintexts while Vault is unavailable: {str(e)}")
+    for ciphertext, plaintext in zip(owned, fetched):
+        if plaintext is None:
+            failed.add(ciphertext)
+            decrypt_flights.resolve(ciphertext, error=ValueError('decryption failed'))
+            continue
+        if not stale:
+            decrypt_cache.set(ciphertext, plaintext)
+        resolved[ciphertext] = plaintext
+        decrypt_flights.resolve(ciphertext, plaintext)
+    for ciphertext, call in joined.items():
+        try:
+            resolved[ciphertext] = call.wait(VAULT_READ_TIMEOUT * (VAULT_MAX_RETRIES + 1))
+        except Exception:
+            failed.add(ciphertext)
+    errors = {}
+    for index, ciphertext in enumerate(ciphertexts):
+        if plaintexts[index] is None:
+            plaintexts[index] = resolved.get(ciphertext)
+            if ciphertext in failed:
+                errors[index] = 'decryption failed'
+    if errors:
+        raise VaultBatchError(f"Decryption failed for {len(errors)} of {len(ciphertexts)} items", plaintexts, errors)
+    return plaintexts
+
+# Decrypt several ciphertexts in one Vault transit call using batch_input
+@observe_vault('decrypt')
+def _vault_decrypt_batch(ciphertexts, raw=False):
+    def parse(item):
+        plaintext = base64.b64decode(item['plaintext'])
+        return plaintext if raw else plaintext.decode('utf-8')
+    batch_input = [{'ciphertext': ciphertext} for ciphertext in ciphertexts]
+    return transit_batch(f"transit/decrypt/{ENCRYPTION_KEY}", batch_input, parse, 'decryption')
+
+# (row, column, ciphertext) of the Transit cells and of the envelope cells of rows
+def encrypted_cells(rows, headers):
+    columns = [i for i, h in enumerate(headers) if h in ENCRYPTED_COLUMNS]
+    cells = []
+    envelope_cells = []
+    for r, row in enumerate(rows):
+        for c in columns:
+            value = row[c]
+            if not isinstance(value, str):
+                continue
+            if TRANSIT_PREFIX.match(value):
+                cells.append((r, c, value))
+            elif value.startswith(ENVELOPE_PREFIX):
+                envelope_cells.append((r, c, value))
+    return cells, envelope_cells
+
+# Raised by decrypt_rows(strict=True) when some cells could not be decrypted
+class DecryptionIncompleteError(Exception):
+    pass
+
+# Decrypt the encrypted cells of fetched rows. Transit ciphertexts are sent in
+# chunked batch calls (in parallel when an executor is given, each waiting for
+# the limiter when one is given); envelope ciphertexts are decrypted locally.
+# Cells that cannot be decrypted keep their original (encrypted) value, or with
+# strict=True raise DecryptionIncompleteError. A caller that holds a pooled
+# connection passes it as conn for the envelope key lookup.
+def decrypt_rows(rows, headers, batch_size=None, executor=None, limiter=None, conn=None, strict=False):
+    batch_size = batch_size or DECRYPT_BATCH_SIZE
+    decrypted_rows = [list(row) for row in rows]
+    cells, envelope_cells = encrypted_cells(decrypted_rows, headers)
+
+    def decrypt_chunk(start):
+        chunk = cells[start:start + batch_size]
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return chunk, vault_decrypt_many([value for _, _, value in chunk])
+        except VaultBatchError as e:
+            return chunk, e.results
+        except Exception as e:
+            logger.error(f"Decryption error for cells {start}-{start + len(chunk) - 1}: {str(e)}")
+            return chunk, [None] * len(chunk)
+
+    starts = range(0, len(cells), batch_size)
+    if executor is not None and len(starts) > 1:
+        results = executor.map(decrypt_chunk, starts)
+    else:
+        results = map(decrypt_chunk, starts)
+    failed = 0
+    for chunk, plaintexts in results:
+        for (r, c, _), plaintext in zip(chunk, plaintexts):
+            if plaintext is not None:
+                decrypted_rows[r][c] = plaintext
+            else:
+                failed += 1
+
+    if envelope_cells:
+        plaintexts = envelope_decrypt_many([value for _, _, value in envelope_cells], conn)
+        for (r, c, _), plaintext in zip(envelope_cells, plaintexts):
+            if plaintext is not None:
+                decrypted_rows[r][c] = plaintext
+            else:
+                failed += 1
+    if strict and failed:
+        raise DecryptionIncompleteError(
+            f"{failed} of {len(cells) + len(envelope_cells)} encrypted cells could not be decrypted")
+    return decrypted_rows
+
+# Decrypt batches of rows on decrypt_executor while the caller keeps pulling the
+# next batch from its source (typically a database cursor). Up to `depth` batches
+# are in flight at once; results are yielded in the order the batches arrived.
+# conn is the connection the batches are read from, shared for envelope key lookups.
+def decrypt_pipeline(batches, headers, depth=None, conn=None):
+    depth = depth or DECRYPT_WORKERS
+    pending = deque()
+    try:
+        for rows in batches:
+            pending.append(decrypt_executor.submit(decrypt_rows, rows, headers, conn=conn))
+            if len(pending) >= depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # A caller that stops early must not release conn under a running decrypt
+        for future in pending:
+            future.cancel()
+        wait(pending)
+
+# FPE transformations on masking-role, and the decode format the masked view shows
+SSN_TRANSFORMATION = 'ssn-fpe'
+PHONE_TRANSFORMATION = 'phone-fpe'
+MASK_DECODE_FORMAT = 'last-four'
+
+# Encode (mask) several values with one Vault Transform call using batch_input.
+# items are (value, transformation) pairs; each batch item names its own transformation.
+@observe_vault('transform')
+def vault_transform_encode_many(items):
+    batch_input = [{'value': value, 'transformation': transformation} for value, transformation in items]
+    return transit_batch("transform/encode/masking-role", batch_input,
+                         lambda item: item['encoded_value'], 'transform encoding')
+
+# Decode several (value, transformation) pairs with one Vault Transform call,
+# optionally into a named decode format
+@observe_vault('transform')
+def vault_transform_decode_many(items, decode_format=None):
+    path = "transform/decode/masking-role" + (f"/{decode_format}" if decode_format else "")
+    batch_input = [{'value': value, 'transformation': transformation} for value, transformation in items]
+    return transit_batch(path, batch_input, lambda item: item['decoded_value'], 'transform decoding')
+
+# Encode (mask) SSN using Vault Transform
+def vault_transform_encode_ssn(ssn_value):
+    return vault_transform_encode_many([(ssn_value, SSN_TRANSFORMATION)])[0]
+
+# Decode an SSN token to its last four digits using Vault Transform
+def vault_transform_decode_ssn(encoded_value):
+    return vault_transform_decode_many([(encoded_value, SSN_TRANSFORMATION)], 'last-four')[0]
+
+# Encode (mask) phone number using Vault Transform
+def vault_transform_encode_phone(phone_value):
+    return vault_transform_encode_many([(phone_value, PHONE_TRANSFORMATION)])[0]
+
+# Decode (unmask) phone number using Vault Transform
 def vault_transform_decode_phone(encoded_value):
-    logger.debug(f"Decoding phone number: {encoded_value}")
+    return vault_transform_decode_many([(encoded_value, PHONE_TRANSFORMATION)], 'full')[0]
+
+def normalize_phone(phone):
+    return ''.join(ch for ch in phone if ch.isdigit())
+
+# Masking is opt-in ([Vault] masking = true), since the Transform engine is not
+# in every Vault edition. When Vault answers 404 for it anyway, writes skip the
+# Transform call for TRANSFORM_RETRY_INTERVAL seconds instead of failing it on
+# every insert.
+TRANSFORM_RETRY_INTERVAL = 300.0
+transform_unavailable_until = 0.0
+
+def masking_enabled():
+    return MASKING and time.monotonic() >= transform_unavailable_until
+
+# Called with the error of a failed Transform request (requests or httpx);
+# returns True when it means the engine is missing
+def note_transform_failure(error):
+    global transform_unavailable_until
+    response = getattr(error, 'response', None)
+    if response is None or response.status_code != 404:
+        return False
+    transform_unavailable_until = time.monotonic() + TRANSFORM_RETRY_INTERVAL
+    logger.warning(f"Vault Transform is not available; skipping masking for {TRANSFORM_RETRY_INTERVAL:.0f} seconds")
+    return True
+
+# FPE tokens for (ssn, phone) pairs, all encoded in one Transform batch call. They
+# are stored next to the Transit ciphertexts so the masked view never needs the
+# plaintext. A value Transform rejects leaves the token empty instead of failing
+# the insert, as does masking being disabled or unavailable; backfill-masks fills
+# them in later.
+def mask_tokens(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    if not masking_enabled():
+        return [(None, None)] * len(pairs)
+    items = []
+    for ssn, phone in pairs:
+        items.append((normalize_ssn(ssn), SSN_TRANSFORMATION))
+        items.append((normalize_phone(phone), PHONE_TRANSFORMATION))
     try:
-        url = f"{VAULT_ADDR}/v1/transform/decode/masking-role/full"
-        headers = {
-            'X-Vault-Token': VAULT_TOKEN,
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            "value": encoded_value,
-            "transformation": "phone-fpe"
-        }
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        decoded_value = response.json()['data']['decoded_value']
-        logger.debug(f"Decoded phone number: {decoded_value}")
-        return decoded_value
+        tokens = vault_transform_encode_many(items)
+    except VaultBatchError as e:
+        tokens = e.results
     except Exception as e:
-        logger.error(f"Phone number decoding failed: {str(e)}")
-        raise
+        if not note_transform_failure(e):
+            logger.error(f"Masking failed: {str(e)}")
+        tokens = [None] * len(items)
+    return [(tokens[i * 2], tokens[i * 2 + 1]) for i in range(len(pairs))]
 
-# Connect to PostgreSQL with dynamic credentials
-def get_db_connection():
-    username, password = get_db_credentials()
+# Decode (transformation, token) pairs to their MASK_DECODE_FORMAT form in one
+# Transform batch call, serving repeats from mask_cache. Tokens that fail to
+# decode come back as None.
+def decode_masks(items):
+    masks = [mask_cache.get(item) for item in items]
+    misses = list(dict.fromkeys(item for item, mask in zip(items, masks) if mask is None))
+    if not misses:
+        return masks
+    try:
+        fetched = vault_transform_decode_many([(token, transformation) for transformation, token in misses],
+                                              MASK_DECODE_FORMAT)
+    except VaultBatchError as e:
+        fetched = e.results
+    resolved = {}
+    for item, mask in zip(misses, fetched):
+        if mask is not None:
+            mask_cache.set(item, mask)
+            resolved[item] = mask
+    return [mask if mask is not None else resolved.get(item) for item, mask in zip(items, masks)]
+
+# Token columns of the employees table, with their transformation and how the
+# decoded last four digits are displayed
+MASKED_COLUMNS = {
+    'ssn_fpe': (SSN_TRANSFORMATION, '***-**-{}'),
+    'phone_fpe': (PHONE_TRANSFORMATION, '***-***-{}'),
+}
+
+# Replace the FPE token cells of fetched rows with masked values. Like
+# decrypt_rows, tokens of every masked column are decoded together in chunked
+# batch calls, in parallel when an executor is given.
+def mask_rows(rows, headers, batch_size=None, executor=None):
+    batch_size = batch_size or DECRYPT_BATCH_SIZE
+    masked_rows = [list(row) for row in rows]
+    cells = []  # (row, column, transformation, token)
+    for c, header in enumerate(headers):
+        if header not in MASKED_COLUMNS:
+            continue
+        for r, row in enumerate(masked_rows):
+            if row[c]:
+                cells.append((r, c, MASKED_COLUMNS[header][0], row[c]))
+            row[c] = ''
+    chunks = [cells[start:start + batch_size] for start in range(0, len(cells), batch_size)]
+
+    def mask_chunk(chunk):
+        try:
+            masks = decode_masks([(transformation, token) for _, _, transformation, token in chunk])
+        except Exception as e:
+            logger.error(f"Decoding masks failed: {str(e)}")
+            masks = [None] * len(chunk)
+        return chunk, masks
+
+    results = executor.map(mask_chunk, chunks) if executor is not None and len(chunks) > 1 else map(mask_chunk, chunks)
+    for chunk, masks in results:
+        for (r, c, _, _), mask in zip(chunk, masks):
+            display = MASKED_COLUMNS[headers[c]][1]
+            masked_rows[r][c] = display.format(mask) if mask is not None else '[unavailable]'
+    return masked_rows
+
+# Open a single PostgreSQL connection with the given dynamic credentials
+def connect_db(username, password):
     logger.debug(f"Connecting to database with user {username}")
     try:
         conn = psycopg2.connect(
@@ -195,8 +1345,341 @@ def get_db_connection():
         logger.error(f"Database connection failed: {str(e)}")
         raise
 
-# Flask app setup
-app = Flask(__name__)
+# Pool of PostgreSQL connections bound to the current Vault credential generation.
+# When the credentials rotate a new pool is opened for the new user; the old pool
+# stops handing out connections and is closed once its last connection comes back.
+class RotatingConnectionPool:
+    def __init__(self, credentials, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 timeout=DB_POOL_TIMEOUT, health_check_after=DB_POOL_HEALTH_CHECK_AFTER):
+        self.credentials = credentials
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._generation = None
+        self._outstanding = {}  # pool -> connections currently checked out
+        self._draining = set()  # retired pools waiting for their connections
+        self._owners = {}       # id(conn) -> pool the connection belongs to
+        self._last_used = {}    # id(conn) -> monotonic time it was last returned
+        self._closed = False
+
+    def _retire(self, pool):
+        if self._outstanding.get(pool, 0) == 0:
+            self._outstanding.pop(pool, None)
+            pool.closeall()
+        else:
+            self._draining.add(pool)
+
+    # Returns the pool for the current credentials with one checkout reserved on
+    # it. The reservation is taken under the same lock as the lookup, so a
+    # rotation cannot close the pool before the caller's getconn(); release it
+    # with _unreserve().
+    def _reserve_pool(self):
+        creds = self.credentials.get_lease()
+        with self._lock:
+            if self._closed:
+                raise psycopg2.pool.PoolError("connection pool is closed")
+            if self._pool is None or creds['generation'] != self._generation:
+                old = self._pool
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn,
+                    host=DB_HOST, port=DB_PORT, dbname=DB_NAME,
+                    user=creds['username'], password=creds['password'],
+                    cursor_factory=TimedCursor
+                )
+                self._generation = creds['generation']
+                self._outstanding[self._pool] = 0
+                logger.info(f"Opened connection pool for credentials generation {self._generation}")
+                if old is not None:
+                    self._retire(old)
+            self._outstanding[self._pool] += 1
+            return self._pool
+
+    def _unreserve(self, pool):
+        with self._lock:
+            self._outstanding[pool] -= 1
+            if pool in self._draining and self._outstanding[pool] == 0:
+                self._draining.discard(pool)
+                self._outstanding.pop(pool, None)
+                pool.closeall()
+                logger.info("Closed drained connection pool")
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        # Freshly opened connections and recently returned ones skip the probe
+        if last_used is None or time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding unhealthy pooled connection: {str(e)}")
+            return False
+
+    def getconn(self):
+        start = time.perf_counter()
+        try:
+            return self._getconn()
+        except Exception:
+            DB_ERRORS.inc(stage='checkout')
+            raise
+        finally:
+            DB_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+    def _getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError(f"no database connection available within {self.timeout}s")
+        try:
+            for _ in range(self.maxconn + 1):
+                pool = self._reserve_pool()
+                try:
+                    conn = pool.getconn()
+                except Exception:
+                    self._unreserve(pool)
+                    raise
+                if self._healthy(conn):
+                    with self._lock:
+                        self._owners[id(conn)] = pool
+                    return conn
+                self._last_used.pop(id(conn), None)
+                try:
+                    pool.putconn(conn, close=True)
+                finally:
+                    self._unreserve(pool)
+            raise psycopg2.pool.PoolError("no healthy database connection available")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        with self._lock:
+            pool = self._owners.pop(id(conn), None)
+            if pool is None:
+                return
+            current = pool is self._pool and not self._closed
+        try:
+            if not conn.closed:
+                conn.rollback()
+        except Exception:
+            pass
+        try:
+            if current and not conn.closed:
+                self._last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn)
+            else:
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+        finally:
+            # The checkout stays reserved until the connection is back, so the
+            # pool cannot be closed under this putconn()
+            self._unreserve(pool)
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'generation': self._generation or 0,
+                'checked_out': sum(self._outstanding.values()),
+                'draining_pools': len(self._draining),
+                'max_connections': self.maxconn,
+            }
+
+    # Stop handing out connections and close every pool once its connections are returned
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._pool is not None:
+                self._retire(self._pool)
+                self._pool = None
+
+# Check out a pooled PostgreSQL connection using the current dynamic credentials
+def get_db_connection():
+    return db_pool.getconn()
+
+# Return a connection obtained from get_db_connection to the pool
+def release_db_connection(conn):
+    db_pool.putconn(conn)
+
+# Ask Transit for a new data key; returns (plaintext key bytes, wrapped key)
+@observe_vault('datakey')
+def vault_generate_data_key():
+    logger.debug(f"Generating data key with key {ENCRYPTION_KEY}")
+    try:
+        response = vault_client.post(f"transit/datakey/plaintext/{ENCRYPTION_KEY}", json={'bits': 256})
+        response.raise_for_status()
+        data = response.json()['data']
+        return base64.b64decode(data['plaintext']), data['ciphertext']
+    except Exception as e:
+        logger.error(f"Data key generation failed: {str(e)}")
+        raise
+
+# Raised by EnvelopeKeyring.write_key(issue=False) when a new data key would be needed
+class WriteKeyUnavailable(Exception):
+    pass
+
+# Envelope encryption: fields are encrypted locally with AES-GCM under a data key
+# issued by Transit. The wrapped data key is stored in employee_data_keys and its
+# id is embedded in every ciphertext, so Vault is only needed to issue a new
+# write key or to unwrap a key that is not in the cache. Storing a new key takes
+# a pooled connection of its own, so callers must not hold one while a key may
+# be issued; reads can go through the caller's connection instead.
+class EnvelopeKeyring:
+    def __init__(self, key_ttl=DATA_KEY_TTL, max_uses=DATA_KEY_MAX_USES, cache_size=DATA_KEY_CACHE_SIZE):
+        self.key_ttl = key_ttl
+        self.max_uses = max_uses
+        self._keys = TTLCache(cache_size, key_ttl)  # key id -> plaintext data key
+        self._write_key = None  # (key id, key bytes, expires_at, uses)
+        self._lock = threading.Lock()
+
+    def _new_write_key(self):
+        key, wrapped = vault_generate_data_key()
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("INSERT INTO employee_data_keys (wrapped_key) VALUES (%s) RETURNING id", (wrapped,))
+                key_id = cur.fetchone()[0]
+            # Commit on its own so the key survives even if the caller's insert rolls back
+            conn.commit()
+        finally:
+            release_db_connection(conn)
+        logger.info(f"Created envelope data key {key_id}")
+        self._keys.set(key_id, key)
+        return [key_id, key, time.monotonic() + self.key_ttl, 0]
+
+    def _usable(self, wk, count):
+        return wk is not None and wk[2] > time.monotonic() and wk[3] + count <= self.max_uses
+
+    # Returns (key id, key bytes) of the current write key, reserving `count` uses.
+    # With issue=False raises WriteKeyUnavailable instead of issuing a new key.
+    def write_key(self, count, issue=True):
+        with self._lock:
+            wk = self._write_key
+            if not self._usable(wk, count):
+                if not issue:
+                    raise WriteKeyUnavailable("envelope write key needs to be reissued")
+                wk = self._write_key = self._new_write_key()
+            wk[3] += count
+            return wk[0], wk[1]
+
+    # Issue a new write key now unless the current one can take `count` more uses
+    def ensure_write_key(self, count):
+        with self._lock:
+            if not self._usable(self._write_key, count):
+                self._write_key = self._new_write_key()
+
+    # Returns {key id: key bytes} for the requested ids, unwrapping cache misses in
+    # one batch call. Wrapped keys are read through conn when given, otherwise
+    # through a connection of their own.
+    def read_keys(self, key_ids, conn=None):
+        keys = {}
+        missing = []
+        for key_id in set(key_ids):
+            key = self._keys.get(key_id)
+            if key is None:
+                missing.append(key_id)
+            else:
+                keys[key_id] = key
+        if not missing:
+            return keys
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, wrapped_key FROM employee_data_keys WHERE id = ANY(%s)", (missing,))
+                wrapped = cur.fetchall()
+        finally:
+            if own_conn:
+                release_db_connection(conn)
+        if not wrapped:
+            return keys
+        try:
+            unwrapped = vault_decrypt_many([w for _, w in wrapped], raw=True)
+        except VaultBatchError as e:
+            unwrapped = e.results
+        for (key_id, _), key in zip(wrapped, unwrapped):
+            if key is not None:
+                self._keys.set(key_id, key)
+                keys[key_id] = key
+        return keys
+
+    def cache_stats(self):
+        return self._keys.stats()
+
+    def clear(self):
+        with self._lock:
+            self._write_key = None
+        self._keys.clear()
+
+def _require_aesgcm():
+    if AESGCM is None:
+        raise RuntimeError("envelope encryption requires the 'cryptography' package")
+
+# Encrypt values locally under the current envelope data key. With
+# issue_key=False raises WriteKeyUnavailable rather than issue a new one.
+def envelope_encrypt_many(values, issue_key=True):
+    _require_aesgcm()
+    values = list(values)
+    if not values:
+        return []
+    key_id, key = envelope_keyring.write_key(len(values), issue_key)
+    aesgcm = AESGCM(key)
+    aad = f"{ENVELOPE_PREFIX}{key_id}".encode('utf-8')
+    ciphertexts = []
+    for value in values:
+        nonce = os.urandom(12)
+        sealed = nonce + aesgcm.encrypt(nonce, value.encode('utf-8'), aad)
+        ciphertexts.append(f"{ENVELOPE_PREFIX}{key_id}:{base64.b64encode(sealed).decode('utf-8')}")
+    return ciphertexts
+
+# Decrypt envelope ciphertexts; items that cannot be decrypted come back as None.
+# conn is a connection the caller already holds, used to read wrapped keys.
+def envelope_decrypt_many(ciphertexts, conn=None):
+    _require_aesgcm()
+    parsed = []
+    for ciphertext in ciphertexts:
+        try:
+            key_id, sealed = ciphertext[len(ENVELOPE_PREFIX):].split(':', 1)
+            parsed.append((int(key_id), base64.b64decode(sealed)))
+        except Exception:
+            logger.error("Malformed envelope ciphertext")
+            parsed.append(None)
+    try:
+        keys = envelope_keyring.read_keys([p[0] for p in parsed if p is not None], conn)
+    except Exception as e:
+        logger.error(f"Failed to load envelope data keys: {str(e)}")
+        return [None] * len(parsed)
+    plaintexts = []
+    for item in parsed:
+        if item is None or item[0] not in keys:
+            plaintexts.append(None)
+            continue
+        key_id, sealed = item
+        try:
+            aad = f"{ENVELOPE_PREFIX}{key_id}".encode('utf-8')
+            plaintext = AESGCM(keys[key_id]).decrypt(sealed[:12], sealed[12:], aad)
+            plaintexts.append(plaintext.decode('utf-8'))
+        except Exception as e:
+            logger.error(f"Envelope decryption failed with data key {key_id}: {str(e)}")
+            plaintexts.append(None)
+    return plaintexts
+
+# Encrypt sensitive field values with the configured encryption mode. Pass
+# issue_key=False while holding a pooled connection (see EnvelopeKeyring).
+def encrypt_fields(values, issue_key=True):
+    if ENCRYPTION_MODE == 'envelope':
+        return envelope_encrypt_many(values, issue_key)
+    return vault_encrypt_many(values)
+
+# Routes and CLI commands; create_app() registers them on a Flask app
+blueprint = Blueprint('employees', __name__, cli_group=None)
 
 base_template = '''
 <!DOCTYPE html>
@@ -370,6 +1853,18 @@ base_template = '''
             background-color: #FFD1D1;
             color: #000000;
         }
+        .pagination {
+            text-align: right;
+            margin-top: 1rem;
+        }
+        .pagination a {
+            color: #000000;
+            font-weight: 600;
+            text-decoration: none;
+        }
+        .pagination a:hover {
+            text-decoration: underline;
+        }
         .loading {
             text-align: center;
             padding: 2rem;
@@ -432,13 +1927,15 @@ base_template = '''
 </head>
 <body>
     <div class="navbar">
-        <a href="{{ url_for('add_employee') }}" {% if request.path == '/' %}class="active"{% endif %}>Add Employee</a>
-        <a href="{{ url_for('view_employees') }}" {% if request.path == '/employees' %}class="active"{% endif %}>View Employees</a>
-        <a href="{{ url_for('view_encrypted_employees') }}" {% if request.path == '/employees/encrypted' %}class="active"{% endif %}>Encrypted View</a>
+        <a href="{{ url_for('employees.add_employee') }}" {% if request.path == '/' %}class="active"{% endif %}>Add Employee</a>
+        <a href="{{ url_for('employees.view_employees') }}" {% if request.path == '/employees' %}class="active"{% endif %}>View Employees</a>
+        <a href="{{ url_for('employees.view_encrypted_employees') }}" {% if request.path == '/employees/encrypted' %}class="active"{% endif %}>Encrypted View</a>
+        <a href="{{ url_for('employees.view_masked_employees') }}" {% if request.path == '/employees/masked' %}class="active"{% endif %}>Masked View</a>
+        <a href="{{ url_for('employees.search_employees') }}" {% if request.path == '/employees/search' %}class="active"{% endif %}>Search</a>
         <div class="navbar-title">HashiCorp Vault Demo</div>
     </div>
     <div class="content">
-        {{ content|safe }}
+        {% block content %}{{ content|safe }}{% endblock %}
     </div>
     <div class="footer">
         &copy; 2025 Employee Vault | Built with Flask
@@ -447,9 +1944,417 @@ base_template = '''
 </html>
 '''
 
-@app.route('/', methods=['GET', 'POST'])
+# Employee table page. Rows arrive as an iterable of batches so the same template
+# serves a single page and a streamed response fed by the decrypt pipeline.
+employee_table_template = '''
+{% extends 'layout.html' %}
+{% block content %}
+    {% if prefix %}{{ prefix|safe }}{% endif %}
+    <h2>{{ title }}</h2>
+    <div class="table-container">
+        <table>
+            <tr>{% for h in headers %}<th>{{ h }}</th>{% endfor %}</tr>
+            {% for batch in batches %}{% for row in batch %}
+            <tr>{{ row|table_cells }}</tr>
+            {%- endfor %}{% endfor %}
+        </table>
+    </div>
+    {% if state and state.error %}<div class="message error">Error fetching data: {{ state.error }}</div>{% endif %}
+    {% if message %}<div class="message">{{ message }}</div>{% endif %}
+    {% if next_url %}<div class="pagination"><a href="{{ next_url }}">Next page &rarr;</a></div>{% endif %}
+{% endblock %}
+'''
+
+# Templates are registered by name so Jinja compiles them once and caches them;
+# the .html names turn on autoescaping.
+TEMPLATES = {
+    'layout.html': base_template,
+    'employee_table.html': employee_table_template,
+}
+
+# Render the cells of one table row, escaping each value once for both the
+# tooltip and the cell text; this is the hot loop of every employee page
+@blueprint.app_template_filter('table_cells')
+def table_cells(row):
+    cells = []
+    for col in row:
+        cell = html.escape(str(col))
+        cells.append(f'<td title="{cell}">{cell}</td>')
+    return Markup(''.join(cells))
+
+@blueprint.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+# Streamed bodies (?stream=1, export, import) are generated after this hook runs,
+# so those are observed when the response is closed, rendering included
+@blueprint.after_app_request
+def observe_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        labels = {'endpoint': request.endpoint or 'unknown', 'status': response.status_code}
+        observe = lambda: HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+        if response.is_streamed:
+            response.call_on_close(observe)
+        else:
+            observe()
+    return response
+
+# Exposition lines for values read at scrape time, such as cache and pool statistics
+def sample_lines(name, metric_type, documentation, samples):
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels([k for k, _ in labels], [v for _, v in labels])} {value}")
+    return lines
+
+# Prometheus text exposition of request, Vault, database, cache and pool metrics
+@blueprint.route('/metrics')
+def metrics():
+    lines = []
+    for metric in (VAULT_REQUEST_SECONDS, VAULT_ERRORS, VAULT_COALESCED, VAULT_STALE_SERVED, DB_CHECKOUT_SECONDS,
+                   DB_QUERY_SECONDS, DB_ERRORS, HTTP_REQUEST_SECONDS, ROWS_SERVED, FIELDS_REVEALED):
+        lines.extend(metric.expose())
+    cache_stats = [((('cache', 'decrypt'),), decrypt_cache.stats()),
+                   ((('cache', 'mask'),), mask_cache.stats()),
+                   ((('cache', 'page'),), page_cache.stats()),
+                   ((('cache', 'data_key'),), envelope_keyring.cache_stats())]
+    for stat, metric_type, name in (('entries', 'gauge', 'cache_entries'), ('bytes', 'gauge', 'cache_bytes'),
+                                    ('hits', 'counter', 'cache_hits_total'), ('misses', 'counter', 'cache_misses_total'),
+                                    ('evictions', 'counter', 'cache_evictions_total')):
+        lines.extend(sample_lines(name, metric_type, f"Cache {stat}.",
+                                  [(labels, stats[stat]) for labels, stats in cache_stats]))
+    lines.extend(sample_lines('vault_circuit_open', 'gauge', '1 while the Vault circuit breaker is open.',
+                              [((), int(vault_client.breaker.is_open))]))
+    pool_stats = db_pool.stats()
+    lines.extend(sample_lines('db_pool_checked_out', 'gauge', 'Connections currently checked out.', [((), pool_stats['checked_out'])]))
+    lines.extend(sample_lines('db_pool_max_connections', 'gauge', 'Maximum pooled connections.', [((), pool_stats['max_connections'])]))
+    lines.extend(sample_lines('db_pool_draining', 'gauge', 'Retired pools waiting for connections to be returned.', [((), pool_stats['draining_pools'])]))
+    lines.extend(sample_lines('db_credentials_generation', 'gauge', 'Current dynamic credential generation.', [((), credential_manager.generation)]))
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# Readiness probe: 200 once the last background Vault health check succeeded.
+# Never waits on Vault itself, so a slow Vault cannot stall the probe.
+@blueprint.route('/ready')
+def ready():
+    status = vault_readiness.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+# Raised when the write-behind queue is at capacity
+class QueueFullError(Exception):
+    pass
+
+# Seal a submission's sensitive fields into one ciphertext for the staging
+# table: locally under the envelope keyring when the cryptography package is
+# installed, otherwise with one Transit call
+def seal_submission(fields):
+    blob = json.dumps(list(fields))
+    if AESGCM is not None:
+        return envelope_encrypt_many([blob])[0]
+    return vault_encrypt_many([blob])[0]
+
+# Open sealed submissions through conn; None where one cannot be opened. Vault
+# or database errors propagate, so the caller can retry the whole batch later.
+def open_submissions(sealed, conn):
+    opened = [None] * len(sealed)
+    envelope = [i for i, value in enumerate(sealed) if value.startswith(ENVELOPE_PREFIX)]
+    transit = [i for i, value in enumerate(sealed) if not value.startswith(ENVELOPE_PREFIX)]
+    if envelope:
+        # Load the data keys first so an unreachable Vault raises here instead
+        # of every submission coming back unopened
+        key_ids = []
+        for i in envelope:
+            try:
+                key_ids.append(int(sealed[i][len(ENVELOPE_PREFIX):].split(':', 1)[0]))
+            except ValueError:
+                pass
+        envelope_keyring.read_keys(key_ids, conn)
+        for i, blob in zip(envelope, envelope_decrypt_many([sealed[i] for i in envelope], conn)):
+            opened[i] = blob
+    if transit:
+        try:
+            blobs = vault_decrypt_many([sealed[i] for i in transit])
+        except VaultBatchError as e:
+            blobs = e.results
+        for i, blob in zip(transit, blobs):
+            opened[i] = blob
+    return [tuple(json.loads(blob)) if blob is not None else None for blob in opened]
+
+# Write-behind ingestion: validated submissions are staged in employee_submissions
+# and a background worker drains them in micro-batches with one Transit batch
+# encrypt and one multi-row INSERT per batch. The sensitive fields are staged
+# sealed (see seal_submission), never in plaintext. A batch that fails while
+# Vault and the database are up is split until the failing submissions are
+# isolated; those are retried up to max_attempts times and then marked failed.
+class SubmissionQueue:
+    # Vault or the database being unavailable: the batch is retried as a whole
+    # later, without counting an attempt against its submissions
+    TRANSIENT_ERRORS = (requests.RequestException, psycopg2.OperationalError, TimeoutError)
+
+    def __init__(self, max_pending=WRITE_BEHIND_QUEUE_MAX, batch_size=WRITE_BEHIND_BATCH_SIZE,
+                 interval=WRITE_BEHIND_INTERVAL, max_attempts=WRITE_BEHIND_MAX_ATTEMPTS):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # Stage a submission and return its id; raises QueueFullError when at capacity
+    def enqueue(self, name, role, email, phone, ssn, address):
+        self.start()
+        # Sealed before taking a connection: a new envelope key needs one of its own
+        sealed = seal_submission((email, phone, ssn, address))
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO employee_submissions (name, role, sealed_fields) "
+                    "SELECT %s, %s, %s "
+                    "WHERE (SELECT count(*) FROM employee_submissions WHERE status = 'pending') < %s "
+                    "RETURNING id",
+                    (name, role, sealed, self.max_pending)
+                )
+                row = cur.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+        if row is None:
+            raise QueueFullError(f"write-behind queue is full ({self.max_pending} pending submissions)")
+        self._wakeup.set()
+        return row[0]
+
+    def status(self, submission_id):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, status, employee_id, error, submitted_at, processed_at, attempts "
+                    "FROM employee_submissions WHERE id = %s",
+                    (submission_id,)
+                )
+                row = cur.fetchone()
+            conn.commit()
+        finally:
+            release_db_connection(conn)
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'status': row[1],
+            'employee_id': row[2],
+            'error': row[3],
+            'submitted_at': row[4].isoformat() if row[4] else None,
+            'processed_at': row[5].isoformat() if row[5] else None,
+            'attempts': row[6],
+        }
+
+    # Process one micro-batch of pending submissions; returns how many were claimed
+    def drain_once(self):
+        while True:
+            if ENCRYPTION_MODE == 'envelope':
+                # Issuing a data key needs a connection of its own, so have one
+                # ready before the claim below holds a connection
+                envelope_keyring.ensure_write_key(self.batch_size * len(ENCRYPTED_COLUMNS))
+            try:
+                return self._drain_batch()
+            except WriteKeyUnavailable:
+                # The key ran out between the two steps; the claim was rolled back
+                continue
+
+    def _drain_batch(self):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                # SKIP LOCKED lets several app workers drain the same queue
+                cur.execute(
+                    "SELECT id, name, role, sealed_fields FROM employee_submissions "
+                    "WHERE status = 'pending' ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED",
+                    (self.batch_size,)
+                )
+                claimed = cur.fetchall()
+                if not claimed:
+                    conn.commit()
+                    return 0
+                batch = []
+                errors = {}
+                for row, fields in zip(claimed, open_submissions([row[3] for row in claimed], conn)):
+                    if fields is None:
+                        errors[row[0]] = 'staged fields could not be decrypted'
+                    else:
+                        batch.append(row[:3] + fields)
+                if batch:
+                    errors.update(self._insert(cur, batch))
+                if errors:
+                    self._record_failures(cur, errors)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+        invalidate_page_cache()
+        logger.info(f"Write-behind: inserted {len(claimed) - len(errors)} employees, {len(errors)} submissions failed")
+        return len(claimed)
+
+    # Insert a claimed batch inside a savepoint. If it fails for any reason other
+    # than a transient one, the savepoint is rolled back and both halves are
+    # tried on their own. Returns {submission id: error} for the submissions
+    # that still failed alone.
+    def _insert(self, cur, batch):
+        cur.execute("SAVEPOINT drain_batch")
+        try:
+            self._insert_batch(cur, batch)
+        except (WriteKeyUnavailable,) + self.TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT drain_batch")
+            cur.execute("RELEASE SAVEPOINT drain_batch")
+            if len(batch) == 1:
+                return {batch[0][0]: str(e)}
+            middle = len(batch) // 2
+            return {**self._insert(cur, batch[:middle]), **self._insert(cur, batch[middle:])}
+        cur.execute("RELEASE SAVEPOINT drain_batch")
+        return {}
+
+    def _insert_batch(self, cur, batch):
+        sensitive = [value for row in batch for value in row[3:]]
+        encrypted = encrypt_fields(sensitive, issue_key=False)
+        indexes = blind_indexes([(row[3], row[5]) for row in batch])
+        masks = mask_tokens([(row[5], row[4]) for row in batch])
+        # Reserve the employee ids up front so each submission knows its row
+        cur.execute("SELECT nextval('employees_id_seq') FROM generate_series(1, %s)", (len(batch),))
+        employee_ids = [r[0] for r in cur.fetchall()]
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO employees (id, name, role, email, phone_number, ssn, address, email_bidx, ssn_bidx, "
+            "ssn_fpe, phone_fpe) VALUES %s",
+            [(employee_ids[i], row[1], row[2]) + tuple(encrypted[i * 4:i * 4 + 4]) + indexes[i] + masks[i]
+             for i, row in enumerate(batch)]
+        )
+        psycopg2.extras.execute_values(
+            cur,
+            "UPDATE employee_submissions AS s SET status = 'done', employee_id = v.employee_id, "
+            "sealed_fields = NULL, processed_at = now() "
+            "FROM (VALUES %s) AS v (id, employee_id) WHERE s.id = v.id",
+            [(row[0], employee_ids[i]) for i, row in enumerate(batch)]
+        )
+
+    # Count an attempt against each failed submission and mark those that have
+    # used up max_attempts as failed, clearing their sealed fields
+    def _record_failures(self, cur, errors):
+        psycopg2.extras.execute_values(
+            cur,
+            "UPDATE employee_submissions AS s SET attempts = s.attempts + 1, error = v.error "
+            "FROM (VALUES %s) AS v (id, error) WHERE s.id = v.id",
+            list(errors.items())
+        )
+        cur.execute(
+            "UPDATE employee_submissions SET status = 'failed', sealed_fields = NULL, processed_at = now() "
+            "WHERE id = ANY(%s) AND attempts >= %s RETURNING id",
+            (list(errors), self.max_attempts)
+        )
+        failed = {row[0] for row in cur.fetchall()}
+        for submission_id, error in errors.items():
+            if submission_id in failed:
+                logger.error(f"Write-behind: submission {submission_id} failed permanently: {error}")
+            else:
+                logger.warning(f"Write-behind: submission {submission_id} failed, will retry: {error}")
+
+    def _prune(self):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM employee_submissions WHERE status IN ('done', 'failed') "
+                    "AND processed_at < now() - make_interval(hours => %s)",
+                    (WRITE_BEHIND_RETENTION,)
+                )
+            conn.commit()
+        finally:
+            release_db_connection(conn)
+
+    def _run(self):
+        failures = 0
+        last_prune = 0.0
+        while True:
+            try:
+                processed = self.drain_once()
+                failures = 0
+                if time.monotonic() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                failures += 1
+                logger.error(f"Write-behind drain failed: {str(e)}")
+                processed = 0
+            if processed < self.batch_size:
+                # Back off while Vault or the database is failing; otherwise wait for new work
+                delay = min(self.interval * (2 ** failures), 30.0)
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+
+    # Start the drain thread if it is not running yet
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+
+
+# Look up a write-behind submission and the employee id it was assigned
+@blueprint.route('/employees/submissions/<int:submission_id>')
+def submission_status(submission_id):
+    try:
+        status = submission_queue.status(submission_id)
+    except Exception as e:
+        logger.error(f"Error fetching submission {submission_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    if status is None:
+        return jsonify({'error': 'submission not found'}), 404
+    return jsonify(status)
+
+# Add Employee form, shown below the result message of a submission
+EMPLOYEE_FORM_HTML = '''
+<h2>Add Employee</h2>
+<div class="form-container">
+    <form method="POST">
+        <div class="form-group">
+            <label for="name">Name</label>
+            <input type="text" name="name" id="name" required placeholder="Enter Name">
+        </div>
+        <div class="form-group">
+            <label for="role">Role</label>
+            <input type="text" name="role" id="role" required placeholder="Enter Role">
+        </div>
+        <div class="form-group">
+            <label for="email">Email</label>
+            <input type="email" name="email" id="email" required placeholder="Enter Email">
+        </div>
+        <div class="form-group">
+            <label for="phone">Phone</label>
+            <input type="tel" name="phone" id="phone" required placeholder="Enter Phone (10 digits)">
+        </div>
+        <div class="form-group">
+            <label for="ssn">SSN</label>
+            <input type="text" name="ssn" id="ssn" required placeholder="Enter SSN (9 digits)">
+        </div>
+        <div class="form-group">
+            <label for="address">Address</label>
+            <input type="text" name="address" id="address" required placeholder="Enter Address">
+        </div>
+        <input type="submit" value="Add Employee">
+    </form>
+</div>
+'''
+
+@blueprint.route('/', methods=['GET', 'POST'])
 def add_employee():
     msg = ''
+    status, response_headers = 200, {}
     if request.method == 'POST':
         name = request.form['name']
         role = request.form['role']
@@ -461,155 +2366,1078 @@ def add_employee():
         # Basic input validation
         if not all([name, role, email, phone, ssn, address]):
             msg = '<div class="message error">All fields are required!</div>'
+        elif WRITE_BEHIND:
+            # Stage the submission; the background worker encrypts and inserts it
+            try:
+                submission_id = submission_queue.enqueue(name, role, email, phone, ssn, address)
+                logger.info(f"Employee {name} queued as submission {submission_id}")
+                msg = f'<div class="message success">Employee {escape(name)} queued as submission <a href="{url_for("employees.submission_status", submission_id=submission_id)}">{submission_id}</a>!</div>'
+            except QueueFullError as e:
+                logger.warning(str(e))
+                msg = '<div class="message error">Too many pending submissions, please try again shortly.</div>'
+                status, response_headers = 503, {'Retry-After': '5'}
+            except Exception as e:
+                logger.error(f"Error queueing employee: {str(e)}")
+                msg = f'<div class="message error">Error: {escape(str(e))}</div>'
         else:
             conn = None
             cur = None
             try:
+                # Encrypt all sensitive fields with one Transit batch call (or locally in envelope mode)
+                encrypted_email, encrypted_phone, encrypted_ssn, encrypted_address = \
+                    encrypt_fields([email, phone, ssn, address])
+                # Blind indexes make email and SSN searchable without decrypting the table
+                (email_bidx, ssn_bidx), = blind_indexes([(email, ssn)])
+                # FPE tokens back the masked view (one more Transform call when masking is enabled)
+                (ssn_fpe, phone_fpe), = mask_tokens([(ssn, phone)])
+
+                # Only check out a connection once the Vault calls are done
                 conn = get_db_connection()
                 cur = conn.cursor()
                 
-                # Encrypt all sensitive fields using Transit
-                encrypted_email = vault_encrypt(email)
-                encrypted_phone = vault_encrypt(phone)
-                encrypted_ssn = vault_encrypt(ssn)
-                encrypted_address = vault_encrypt(address)
-                
-                logger.debug(f"Inserting employee: {name}, {role}, {encrypted_email}, {encrypted_phone}, {encrypted_ssn}, {encrypted_address}")
-                cur.execute("INSERT INTO employees (id, name, role, email, phone_number, ssn, address) VALUES (DEFAULT, %s, %s, %s, %s, %s, %s) RETURNING id",
-                           (name, role, encrypted_email, encrypted_phone, encrypted_ssn, encrypted_address))
+                logger.debug("Inserting employee")
+                cur.execute("INSERT INTO employees (id, name, role, email, phone_number, ssn, address, email_bidx, ssn_bidx, ssn_fpe, phone_fpe) VALUES (DEFAULT, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
+                           (name, role, encrypted_email, encrypted_phone, encrypted_ssn, encrypted_address, email_bidx, ssn_bidx, ssn_fpe, phone_fpe))
                 emp_id = cur.fetchone()[0]
                 conn.commit()
+                invalidate_page_cache()
                 logger.info(f"Employee {name} added successfully with ID {emp_id}")
-                msg = f'<div class="message success">Employee {name} added successfully with ID {emp_id}!</div>'
+                msg = f'<div class="message success">Employee {escape(name)} added successfully with ID {emp_id}!</div>'
             except Exception as e:
                 logger.error(f"Error adding employee: {str(e)}")
-                msg = f'<div class="message error">Error: {str(e)}</div>'
+                msg = f'<div class="message error">Error: {escape(str(e))}</div>'
                 if conn:
                     conn.rollback()
             finally:
                 if cur:
                     cur.close()
                 if conn:
-                    conn.close()
+                    release_db_connection(conn)
 
-    form_html = '''
-    <h2>Add Employee</h2>
-    <div class="form-container">
-        <form method="POST">
-            <div class="form-group">
-                <label for="name">Name</label>
-                <input type="text" name="name" id="name" required placeholder="Enter Name">
-            </div>
-            <div class="form-group">
-                <label for="role">Role</label>
-                <input type="text" name="role" id="role" required placeholder="Enter Role">
-            </div>
-            <div class="form-group">
-                <label for="email">Email</label>
-                <input type="email" name="email" id="email" required placeholder="Enter Email">
-            </div>
-            <div class="form-group">
-                <label for="phone">Phone</label>
-                <input type="tel" name="phone" id="phone" required placeholder="Enter Phone (10 digits)">
-            </div>
-            <div class="form-group">
-                <label for="ssn">SSN</label>
-                <input type="text" name="ssn" id="ssn" required placeholder="Enter SSN (9 digits)">
-            </div>
-            <div class="form-group">
-                <label for="address">Address</label>
-                <input type="text" name="address" id="address" required placeholder="Enter Address">
-            </div>
-            <input type="submit" value="Add Employee">
-        </form>
-    </div>
-    '''
-    return render_template_string(base_template, content=msg + form_html)
+    return render_template('layout.html', content=msg + EMPLOYEE_FORM_HTML), status, response_headers
+
+# Parse the ?after_id=&limit= keyset pagination parameters
+def get_page_params():
+    after_id = request.args.get('after_id', default=0, type=int)
+    limit = request.args.get('limit', default=PAGE_SIZE, type=int)
+    return after_id, max(1, min(limit, MAX_PAGE_SIZE))
+
+# ?fields= projection of the current request
+def get_field_params():
+    return parse_fields(request.args.get('fields'))
+
+# Link to the page after rows, keeping the ?fields= projection
+def next_page_url(rows, limit):
+    if not limit or len(rows) < limit:
+        return None
+    params = {'after_id': rows[-1][0], 'limit': limit}
+    if request.args.get('fields'):
+        params['fields'] = request.args['fields']
+    return f"{request.path}?{urlencode(params)}"
 
-@app.route('/employees')
+# Render a single page of an employee table with a link to the next page
+def render_employee_table(title, headers, rows, limit=None, **context):
+    next_url = next_page_url(rows, limit)
+    return render_template('employee_table.html', title=title, headers=headers,
+                           batches=[rows], next_url=next_url, **context)
+
+# Render an error message in the page layout
+def render_error(message):
+    return render_template('layout.html', content=f'<div class="message error">{escape(message)}</div>')
+
+# Stream every employee after after_id as HTML, reading through a named
+# server-side cursor so memory stays flat regardless of the table size
+def stream_employee_table(title, decrypt):
+    after_id, _ = get_page_params()
+    fields = get_field_params()
+    conn = get_db_connection()
+    cur = None
+    try:
+        cur = conn.cursor(name='employees_stream')
+        cur.execute(f"{employee_select(fields)} WHERE id > %s ORDER BY id", (after_id,))
+        first = cur.fetchmany(STREAM_FETCH_SIZE)
+        headers = [desc[0] for desc in cur.description]
+    except Exception:
+        if cur:
+            cur.close()
+        release_db_connection(conn)
+        raise
+    state = {'error': None}
+
+    view = 'employees_stream' if decrypt else 'employees_encrypted_stream'
+
+    def fetch_batches():
+        batch = first
+        while batch:
+            ROWS_SERVED.inc(len(batch), view=view)
+            yield batch
+            batch = cur.fetchmany(STREAM_FETCH_SIZE)
+
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            cur.close()
+            release_db_connection(conn)
+
+    def batches():
+        try:
+            # Decrypt earlier batches in parallel while the next one is fetched
+            yield from decrypt_pipeline(fetch_batches(), headers, conn=conn) if decrypt else fetch_batches()
+        except Exception as e:
+            logger.error(f"Error streaming employees: {str(e)}")
+            state['error'] = str(e)
+        finally:
+            release()
+
+    body = batches()
+
+    # The WSGI server closes the response even when the client hangs up before
+    # the body is read, in which case batches() never starts
+    def close():
+        body.close()
+        release()
+
+    response = Response(stream_template('employee_table.html', title=title, headers=headers,
+                                        batches=body, state=state), mimetype='text/html')
+    response.call_on_close(close)
+    return response
+
+@blueprint.route('/employees')
 def view_employees():
-    content = '<div class="loading">Loading employee records...</div>'
+    if request.args.get('stream'):
+        try:
+            return stream_employee_table('Employee Records', decrypt=True)
+        except Exception as e:
+            logger.error(f"Error fetching employees: {str(e)}")
+            return render_error(f"Error fetching data: {str(e)}")
+
     conn = None
     cur = None
     try:
+        after_id, limit = get_page_params()
+        fields = get_field_params()
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT * FROM employees")
+        cur.execute(f"{employee_select(fields)} WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit))
         rows = cur.fetchall()
         headers = [desc[0] for desc in cur.description]
         
-        # Decrypt all sensitive fields using Transit
-        decrypted_rows = []
-        for row in rows:
-            decrypted_row = list(row)
-            try:
-                decrypted_row[3] = vault_decrypt(row[3]) if row[3].startswith('vault:v1:') else row[3]
-                decrypted_row[4] = vault_decrypt(row[4]) if row[4].startswith('vault:v1:') else row[4]
-                decrypted_row[5] = vault_decrypt(row[5]) if row[5].startswith('vault:v1:') else row[5]
-                decrypted_row[6] = vault_decrypt(row[6]) if row[6].startswith('vault:v1:') else row[6]
-            except Exception as e:
-                logger.error(f"Decryption error for row {row[0]}: {str(e)}")
-                decrypted_row[3] = row[3]  # Keep original value if decryption fails
-                decrypted_row[4] = row[4]
-                decrypted_row[5] = row[5]
-                decrypted_row[6] = row[6]
-            decrypted_rows.append(decrypted_row)
+        # Decrypt the selected sensitive fields using parallel, chunked Transit batch calls
+        decrypted_rows = decrypt_rows(rows, headers, executor=decrypt_executor, conn=conn)
         
-        content = '''
-        <h2>Employee Records</h2>
-        <div class="table-container">
-            <table>
-                <tr>{}</tr>
-                {}
-            </table>
-        </div>
-        '''.format(
-            ''.join([f'<th>{h}</th>' for h in headers]),
-            ''.join(['<tr>' + ''.join([f'<td title="{str(col)}">{str(col)}</td>' for col in row]) + '</tr>' for row in decrypted_rows])
-        )
+        ROWS_SERVED.inc(len(rows), view='employees')
+        page = render_employee_table('Employee Records', headers, decrypted_rows, limit)
     except Exception as e:
         logger.error(f"Error fetching employees: {str(e)}")
-        content = f'<div class="message error">Error fetching data: {str(e)}</div>'
+        page = render_error(f"Error fetching data: {str(e)}")
     finally:
         if cur:
             cur.close()
         if conn:
-            conn.close()
-    return render_template_string(base_template, content=content)
+            release_db_connection(conn)
+    return page
+
+# Change token of one encrypted-view page: row count, last id and a digest of
+# the rows' xmin. An insert into the page's id range changes the count or last id,
+# and any UPDATE (such as a rewrap) gives the row a new xmin. Reads only the
+# page's ids and xmin through the primary key, never the ciphertexts.
+ENCRYPTED_PAGE_TOKEN = (
+    "SELECT count(*), max(id), md5(string_agg(xmin::text, ',' ORDER BY id)) "
+    "FROM (SELECT id, xmin FROM employees WHERE id > %s ORDER BY id LIMIT %s) AS page"
+)
+
+# ETag of a rendered page: the change token plus everything else the HTML depends on
+def page_etag(path, token, after_id, limit, fields):
+    return hashlib.sha1(repr((path, tuple(token), after_id, limit, fields)).encode('utf-8')).hexdigest()
 
-@app.route('/employees/encrypted')
+# Drop cached pages after new rows are written. Only pages that were not full
+# can gain rows from an insert; all_pages also drops full pages, for updates
+# that change existing ciphertexts. ETags still change without this, since the
+# change token is read on every request; this just frees the memory sooner.
+def invalidate_page_cache(all_pages=False):
+    if all_pages:
+        page_cache.clear()
+    else:
+        page_cache.invalidate(lambda key: not key[1])
+
+# Ciphertext only changes when rows are inserted or rewrapped, so this view is
+# served from a change token: a matching If-None-Match gets 304 and a known
+# token is served from page_cache, each after a single query over the page's ids.
+@blueprint.route('/employees/encrypted')
 def view_encrypted_employees():
-    content = '<div class="loading">Loading encrypted employee records...</div>'
+    if request.args.get('stream'):
+        try:
+            return stream_employee_table('Encrypted Employee Records', decrypt=False)
+        except Exception as e:
+            logger.error(f"Error fetching encrypted employees: {str(e)}")
+            return render_error(f"Error fetching data: {str(e)}")
+
+    conn = None
+    cur = None
+    etag = None
+    try:
+        after_id, limit = get_page_params()
+        fields = get_field_params()
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(ENCRYPTED_PAGE_TOKEN, (after_id, limit))
+        token = cur.fetchone()
+        etag = page_etag(request.path, token, after_id, limit, fields)
+        if request.if_none_match.contains(etag):
+            page = None
+        else:
+            full = token[0] == limit
+            page = page_cache.get((etag, full))
+            if page is None:
+                cur.execute(f"{employee_select(fields)} WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit))
+                rows = cur.fetchall()
+                headers = [desc[0] for desc in cur.description]
+
+                ROWS_SERVED.inc(len(rows), view='employees_encrypted')
+                page = render_employee_table('Encrypted Employee Records', headers, rows, limit)
+                page_cache.set((etag, full), page)
+    except Exception as e:
+        logger.error(f"Error fetching encrypted employees: {str(e)}")
+        return render_error(f"Error fetching data: {str(e)}")
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
+
+    response = Response(page, status=304 if page is None else 200, mimetype='text/html')
+    response.set_etag(etag)
+    # Cacheable, but revalidated with the server on every view
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# JSON page of employees. Encrypted fields come back as handles (the stored
+# ciphertext plus its reveal URL) rather than plaintext, so a listing makes no
+# Vault calls; clients decrypt only the cells they show via the reveal endpoint.
+@blueprint.route('/api/employees')
+def api_employees():
     conn = None
     cur = None
+    try:
+        after_id, limit = get_page_params()
+        fields = get_field_params()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT * FROM employees")
+        cur.execute(f"{employee_select(fields)} WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit))
         rows = cur.fetchall()
         headers = [desc[0] for desc in cur.description]
+    except Exception as e:
+        logger.error(f"Error fetching employees: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
 
-        content = '''
-        <h2>Encrypted Employee Records</h2>
-        <div class="table-container">
-            <table>
-                <tr>{}</tr>
-                {}
-            </table>
-        </div>
-        '''.format(
-            ''.join([f'<th>{h}</th>' for h in headers]),
-            ''.join(['<tr>' + ''.join([f'<td title="{str(col)}">{str(col)}</td>' for col in row]) + '</tr>' for row in rows])
-        )
+    employees = []
+    for row in rows:
+        employee = dict(zip(headers, row))
+        for column in ENCRYPTED_COLUMNS:
+            value = employee.get(column)
+            if is_encrypted(value):
+                employee[column] = {'handle': value,
+                                    'reveal': url_for('.reveal_employee_field', employee_id=employee['id'], field=column)}
+        employees.append(employee)
+    ROWS_SERVED.inc(len(rows), view='employees_api')
+    return jsonify({'employees': employees, 'next': next_page_url(rows, limit)})
+
+# Decrypt one encrypted field of one employee: a single Vault call (or none when
+# the plaintext is cached). The response is marked no-store.
+@blueprint.route('/employees/<int:employee_id>/reveal')
+def reveal_employee_field(employee_id):
+    field = request.args.get('field', '')
+    if field not in ENCRYPTED_COLUMNS:
+        return jsonify({'error': f"field must be one of {', '.join(ENCRYPTED_COLUMNS)}"}), 400
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(f"SELECT {field} FROM employees WHERE id = %s", (employee_id,))
+        row = cur.fetchone()
     except Exception as e:
-        logger.error(f"Error fetching encrypted employees: {str(e)}")
-        content = f'<div class="message error">Error fetching data: {str(e)}</div>'
+        logger.error(f"Error fetching employee {employee_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
+    if row is None:
+        return jsonify({'error': 'employee not found'}), 404
+
+    value = row[0]
+    try:
+        if isinstance(value, str) and value.startswith(ENVELOPE_PREFIX):
+            value = envelope_decrypt_many([value])[0]
+        elif is_encrypted(value):
+            value = vault_decrypt(value)
+    except Exception as e:
+        logger.error(f"Error revealing {field} of employee {employee_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 502
+    if value is None:
+        return jsonify({'error': 'decryption failed'}), 502
+    FIELDS_REVEALED.inc(field=field)
+    logger.info(f"Revealed {field} of employee {employee_id}")
+    return jsonify({'id': employee_id, 'field': field, 'value': value}), 200, {'Cache-Control': 'no-store'}
+
+# Columns of the masked view: FPE tokens instead of Transit ciphertexts
+MASKED_SELECT = "SELECT id, name, role, ssn_fpe, phone_fpe FROM employees"
+MASKED_HEADERS = ('id', 'name', 'role', 'ssn', 'phone_number')
+
+# Employees with SSN and phone reduced to their last four digits via Vault
+# Transform. Nothing is decrypted with Transit on this page.
+@blueprint.route('/employees/masked')
+def view_masked_employees():
+    if not MASKING:
+        return render_error("The masked view is disabled; set masking = true in the [Vault] section to enable it."), 404
+    conn = None
+    cur = None
+    try:
+        after_id, limit = get_page_params()
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(f"{MASKED_SELECT} WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit))
+        rows = cur.fetchall()
+        headers = [desc[0] for desc in cur.description]
+
+        masked_rows = mask_rows(rows, headers, executor=decrypt_executor)
+
+        ROWS_SERVED.inc(len(rows), view='employees_masked')
+        page = render_employee_table('Masked Employee Records', MASKED_HEADERS, masked_rows, limit)
+    except Exception as e:
+        logger.error(f"Error fetching masked employees: {str(e)}")
+        page = render_error(f"Error fetching data: {str(e)}")
     finally:
         if cur:
             cur.close()
         if conn:
-            conn.close()
-    return render_template_string(base_template, content=content)
+            release_db_connection(conn)
+    return page
+
+# Columns filled by a bulk import, in INSERT order
+IMPORT_FIELDS = ('name', 'role', 'email', 'phone_number', 'ssn', 'address')
+
+# Read employee records from a CSV (with a header row) or JSONL text stream.
+# Lines that cannot be parsed come back as None so they are counted as skipped.
+def read_employee_records(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+# Turn an import record into an IMPORT_FIELDS tuple, or None if it is incomplete
+def normalize_import_record(record):
+    if not isinstance(record, dict):
+        return None
+    if 'phone_number' not in record and 'phone' in record:
+        record = dict(record, phone_number=record['phone'])
+    values = tuple(str(record.get(field) or '').strip() for field in IMPORT_FIELDS)
+    return values if all(values) else None
+
+# Bulk import employee records in chunks. Each chunk's sensitive fields are
+# encrypted with one batch call and inserted with execute_values, and the
+# checkpoint in employee_imports is advanced in the same transaction, so an
+# interrupted import resumes after the last committed chunk. A finished import
+# is marked completed, and importing under the same name again starts a new
+# run. Yields progress after every chunk.
+def import_employees(records, import_name, chunk_size=None):
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT records, inserted, skipped, completed_at FROM employee_imports WHERE name = %s",
+                        (import_name,))
+            checkpoint = cur.fetchone()
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+    if checkpoint is None or checkpoint[3] is not None:
+        done, inserted, skipped = 0, 0, 0
+    else:
+        done, inserted, skipped = checkpoint[:3]
+        logger.info(f"Resuming import {import_name} after {done} records")
+
+    records = itertools.islice(records, done, None)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        valid = [values for values in map(normalize_import_record, chunk) if values is not None]
+        sensitive = [value for values in valid for value in values[2:]]
+        encrypted = encrypt_fields(sensitive) if sensitive else []
+        indexes = blind_indexes([(values[2], values[4]) for values in valid]) if valid else []
+        masks = mask_tokens([(values[4], values[3]) for values in valid])
+        rows = [values[:2] + tuple(encrypted[i * 4:i * 4 + 4]) + indexes[i] + masks[i] for i, values in enumerate(valid)]
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                if rows:
+                    psycopg2.extras.execute_values(
+                        cur,
+                        f"INSERT INTO employees ({', '.join(IMPORT_FIELDS)}, email_bidx, ssn_bidx, ssn_fpe, phone_fpe) VALUES %s",
+                        rows, page_size=len(rows)
+                    )
+                cur.execute(
+                    "INSERT INTO employee_imports (name, records, inserted, skipped, updated_at, completed_at) "
+                    "VALUES (%s, %s, %s, %s, now(), NULL) "
+                    "ON CONFLICT (name) DO UPDATE SET records = EXCLUDED.records, "
+                    "inserted = EXCLUDED.inserted, skipped = EXCLUDED.skipped, updated_at = now(), "
+                    "completed_at = NULL",
+                    (import_name, done + len(chunk), inserted + len(rows), skipped + len(chunk) - len(rows))
+                )
+            conn.commit()
+            if rows:
+                invalidate_page_cache()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+
+        done += len(chunk)
+        inserted += len(rows)
+        skipped += len(chunk) - len(rows)
+        logger.info(f"Import {import_name}: {done} records read, {inserted} inserted, {skipped} skipped")
+        yield {'records': done, 'inserted': inserted, 'skipped': skipped}
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE employee_imports SET completed_at = now() WHERE name = %s", (import_name,))
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+
+# Work out the import format from an explicit value or the file name
+def import_format(filename, fmt=None):
+    fmt = (fmt or os.path.splitext(filename or '')[1].lstrip('.')).lower()
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError("Format must be csv or jsonl")
+    return fmt
+
+# Upload a CSV/JSONL file and stream the import progress back as plain text
+@blueprint.route('/employees/import', methods=['POST'])
+def import_employees_upload():
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return Response("No file uploaded\n", status=400, mimetype='text/plain')
+    try:
+        fmt = import_format(upload.filename, request.form.get('format'))
+    except ValueError as e:
+        return Response(f"{str(e)}\n", status=400, mimetype='text/plain')
+    import_name = request.form.get('name') or upload.filename
+
+    def generate():
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+        try:
+            for progress in import_employees(read_employee_records(stream, fmt), import_name):
+                yield f"records={progress['records']} inserted={progress['inserted']} skipped={progress['skipped']}\n"
+            yield "done\n"
+        except Exception as e:
+            logger.error(f"Import {import_name} failed: {str(e)}")
+            yield f"error: {str(e)}\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/plain')
+
+# flask --app app import-employees employees.csv
+@blueprint.cli.command('import-employees')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Input format (default: from the file extension).')
+@click.option('--name', 'import_name', help='Checkpoint name used to resume an interrupted import (default: the file name).')
+@click.option('--chunk-size', type=int, help='Records per batch (default: import_chunk_size from config.ini).')
+def import_employees_command(path, fmt, import_name, chunk_size):
+    """Bulk import employees from a CSV or JSONL file."""
+    fmt = import_format(path, fmt)
+    import_name = import_name or os.path.basename(path)
+    with open(path, encoding='utf-8', newline='') as stream:
+        for progress in import_employees(read_employee_records(stream, fmt), import_name, chunk_size):
+            click.echo(f"{progress['records']} records read, {progress['inserted']} inserted, {progress['skipped']} skipped")
+    click.echo("Import complete")
+
+# Fill in missing blind indexes for existing rows, scanning the table in keyset
+# chunks. Indexes in the old Vault HMAC format (vault:v<n>:...) are recomputed
+# too; with reindex=True every row is, after blind_index_key_version changes.
+def backfill_blind_indexes(chunk_size=None, reindex=False):
+    chunk_size = chunk_size or DECRYPT_BATCH_SIZE
+    after_id = 0
+    updated = 0
+    condition = "TRUE" if reindex else (
+        "(email_bidx IS NULL OR ssn_bidx IS NULL OR email_bidx LIKE 'vault:%%' OR ssn_bidx LIKE 'vault:%%')")
+    while True:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"SELECT id, email, ssn FROM employees WHERE id > %s AND {condition} ORDER BY id LIMIT %s",
+                    (after_id, chunk_size)
+                )
+                rows = cur.fetchall()
+                if not rows:
+                    conn.commit()
+                    break
+                after_id = rows[-1][0]
+                decrypted = decrypt_rows(rows, ('id', 'email', 'ssn'), conn=conn)
+                # Cells that are still encrypted (or placeholders) cannot be indexed yet
+                plain = [row for row in decrypted
+                         if not any(is_encrypted(v) for v in row[1:])]
+                if plain:
+                    indexes = blind_indexes([(row[1], row[2]) for row in plain])
+                    psycopg2.extras.execute_values(
+                        cur,
+                        "UPDATE employees AS e SET email_bidx = v.email_bidx, ssn_bidx = v.ssn_bidx "
+                        "FROM (VALUES %s) AS v (id, email_bidx, ssn_bidx) WHERE e.id = v.id",
+                        [(row[0],) + index for row, index in zip(plain, indexes)]
+                    )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+        updated += len(plain)
+        logger.info(f"Blind index backfill: {updated} rows indexed, up to id {after_id}")
+        yield {'after_id': after_id, 'updated': updated}
+
+# flask --app app backfill-blind-index
+@blueprint.cli.command('backfill-blind-index')
+@click.option('--chunk-size', type=int, help='Rows per batch (default: decrypt_batch_size from config.ini).')
+@click.option('--all', 'reindex', is_flag=True, help='Recompute every row, e.g. after changing blind_index_key_version.')
+def backfill_blind_index_command(chunk_size, reindex):
+    """Compute email/SSN blind indexes for rows that do not have them yet."""
+    for progress in backfill_blind_indexes(chunk_size, reindex):
+        click.echo(f"{progress['updated']} rows indexed, up to id {progress['after_id']}")
+    click.echo("Backfill complete")
+
+# Compute FPE tokens for rows inserted before the masked view existed (or while
+# Transform was unavailable), in keyset chunks. Yields progress after every chunk.
+def backfill_mask_tokens(chunk_size=None):
+    chunk_size = chunk_size or DECRYPT_BATCH_SIZE
+    after_id = 0
+    updated = 0
+    while True:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, ssn, phone_number FROM employees "
+                    "WHERE id > %s AND (ssn_fpe IS NULL OR phone_fpe IS NULL) ORDER BY id LIMIT %s",
+                    (after_id, chunk_size)
+                )
+                rows = cur.fetchall()
+                if not rows:
+                    conn.commit()
+                    break
+                after_id = rows[-1][0]
+                decrypted = decrypt_rows(rows, ('id', 'ssn', 'phone_number'), conn=conn)
+                plain = [row for row in decrypted
+                         if not any(is_encrypted(v) for v in row[1:])]
+                tokens = mask_tokens([(row[1], row[2]) for row in plain])
+                filled = [(row[0],) + token for row, token in zip(plain, tokens) if all(token)]
+                if filled:
+                    psycopg2.extras.execute_values(
+                        cur,
+                        "UPDATE employees AS e SET ssn_fpe = v.ssn_fpe, phone_fpe = v.phone_fpe "
+                        "FROM (VALUES %s) AS v (id, ssn_fpe, phone_fpe) WHERE e.id = v.id",
+                        filled
+                    )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+        updated += len(filled)
+        logger.info(f"Mask token backfill: {updated} rows updated, up to id {after_id}")
+        yield {'after_id': after_id, 'updated': updated}
+
+# flask --app app backfill-masks
+@blueprint.cli.command('backfill-masks')
+@click.option('--chunk-size', type=int, help='Rows per batch (default: decrypt_batch_size from config.ini).')
+def backfill_masks_command(chunk_size):
+    """Compute SSN/phone FPE tokens for rows that do not have them yet."""
+    if not MASKING:
+        raise click.ClickException("Masking is disabled; set masking = true in the [Vault] section first")
+    for progress in backfill_mask_tokens(chunk_size):
+        click.echo(f"{progress['updated']} rows updated, up to id {progress['after_id']}")
+    click.echo("Backfill complete")
+
+# Look up employees by email or SSN through their blind index and decrypt only the matches
+@blueprint.route('/employees/search')
+def search_employees():
+    email = request.args.get('email', '').strip()
+    ssn = request.args.get('ssn', '').strip()
+    form_html = '''
+    <h2>Search Employees</h2>
+    <div class="form-container">
+        <form method="GET">
+            <div class="form-group">
+                <label for="email">Email</label>
+                <input type="email" name="email" id="email" placeholder="Enter Email">
+            </div>
+            <div class="form-group">
+                <label for="ssn">SSN</label>
+                <input type="text" name="ssn" id="ssn" placeholder="Enter SSN (9 digits)">
+            </div>
+            <input type="submit" value="Search">
+        </form>
+    </div>
+    '''
+    if not email and not ssn:
+        return render_template('layout.html', content=form_html)
+
+    conn = None
+    cur = None
+    try:
+        conditions = []
+        values = []
+        if email:
+            conditions.append("email_bidx = %s")
+            values.append('email:' + normalize_email(email))
+        if ssn:
+            conditions.append("ssn_bidx = %s")
+            values.append('ssn:' + normalize_ssn(ssn))
+        params = blind_index_many(values)
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(f"{EMPLOYEE_SELECT} WHERE {' AND '.join(conditions)} ORDER BY id LIMIT %s", params + [MAX_PAGE_SIZE])
+        rows = cur.fetchall()
+        headers = [desc[0] for desc in cur.description]
+        ROWS_SERVED.inc(len(rows), view='search')
+        page = render_employee_table('Search Results', headers, decrypt_rows(rows, headers, conn=conn), prefix=form_html,
+                                     message=None if rows else 'No matching employees found.')
+    except Exception as e:
+        logger.error(f"Error searching employees: {str(e)}")
+        page = render_template('layout.html', content=form_html + f'<div class="message error">Error searching data: {escape(str(e))}</div>')
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_db_connection(conn)
+    return page
+
+# Last position recorded for a resumable background job, or 0
+def load_job_checkpoint(name):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT position FROM job_checkpoints WHERE name = %s", (name,))
+            row = cur.fetchone()
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+    return row[0] if row else 0
+
+def save_job_checkpoint(name, position):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO job_checkpoints (name, position, updated_at) VALUES (%s, %s, now()) "
+                "ON CONFLICT (name) DO UPDATE SET position = EXCLUDED.position, updated_at = now()",
+                (name, position)
+            )
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+
+# Rewrap the encrypted cells of one chunk of rows to the latest key version and
+# write them back with a single batched UPDATE. Returns the number of cells rewrapped.
+def rewrap_chunk(rows, latest_version, limiter, batch_size):
+    cells = []
+    for r, row in enumerate(rows):
+        for c, value in enumerate(row[1:], start=1):
+            match = TRANSIT_PREFIX.match(value) if isinstance(value, str) else None
+            if match and int(match.group(1)) < latest_version:
+                cells.append((r, c, value))
+    if not cells:
+        return 0
+
+    updates = [[row[0], None, None, None, None] for row in rows]
+    rewrapped = 0
+    for start in range(0, len(cells), batch_size):
+        chunk = cells[start:start + batch_size]
+        limiter.acquire()
+        try:
+            ciphertexts = vault_rewrap_many([value for _, _, value in chunk])
+        except VaultBatchError as e:
+            ciphertexts = e.results
+        for (r, c, _), ciphertext in zip(chunk, ciphertexts):
+            if ciphertext is not None:
+                updates[r][c] = ciphertext
+                rewrapped += 1
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            # Cells that were not rewrapped come through as NULL and keep their current value
+            psycopg2.extras.execute_values(
+                cur,
+                "UPDATE employees AS e SET "
+                "email = COALESCE(v.email, e.email), phone_number = COALESCE(v.phone_number, e.phone_number), "
+                "ssn = COALESCE(v.ssn, e.ssn), address = COALESCE(v.address, e.address) "
+                "FROM (VALUES %s) AS v (id, email, phone_number, ssn, address) WHERE e.id = v.id",
+                [tuple(update) for update in updates if any(update[1:])],
+                template="(%s, %s::text, %s::text, %s::text, %s::text)"
+            )
+        conn.commit()
+        invalidate_page_cache(all_pages=True)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_db_connection(conn)
+    return rewrapped
+
+# Rewrap the envelope data keys in employee_data_keys that are wrapped under an
+# older key version. The unwrapped keys do not change, so envelope ciphertexts and
+# cached keys stay valid. Returns the number of keys rewrapped.
+def rewrap_data_keys(latest_version, limiter, batch_size):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, wrapped_key FROM employee_data_keys ORDER BY id")
+            keys = [(key_id, wrapped) for key_id, wrapped in cur.fetchall()
+                    if TRANSIT_PREFIX.match(wrapped) and int(TRANSIT_PREFIX.match(wrapped).group(1)) < latest_version]
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+
+    updates = []
+    for start in range(0, len(keys), batch_size):
+        chunk = keys[start:start + batch_size]
+        limiter.acquire()
+        try:
+            rewrapped = vault_rewrap_many([wrapped for _, wrapped in chunk])
+        except VaultBatchError as e:
+            rewrapped = e.results
+        updates += [(key_id, wrapped) for (key_id, _), wrapped in zip(chunk, rewrapped) if wrapped is not None]
+    if not updates:
+        return 0
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                "UPDATE employee_data_keys AS k SET wrapped_key = v.wrapped_key "
+                "FROM (VALUES %s) AS v (id, wrapped_key) WHERE k.id = v.id",
+                updates
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_db_connection(conn)
+    if len(updates) < len(keys):
+        logger.warning(f"{len(keys) - len(updates)} envelope data keys could not be rewrapped")
+    return len(updates)
+
+# Rewrap every Transit ciphertext in employees, and the wrapped envelope data keys,
+# to the latest key version. Rows are scanned in keyset chunks that are rewrapped
+# by `workers` threads, Vault calls are throttled to `rps` requests per second,
+# and the last fully processed id is checkpointed so an interrupted run resumes
+# where it stopped. A run that finishes resets the checkpoint, so the next
+# rotation scans the whole table again.
+def rewrap_employees(name='rewrap', chunk_size=None, workers=None, rps=None):
+    chunk_size = chunk_size or REWRAP_CHUNK_SIZE
+    workers = workers or REWRAP_WORKERS
+    limiter = RateLimiter(rps or REWRAP_RPS)
+    latest_version = vault_key_latest_version()
+    data_keys = rewrap_data_keys(latest_version, limiter, DECRYPT_BATCH_SIZE)
+    if data_keys:
+        logger.info(f"Rewrap {name}: {data_keys} envelope data keys rewrapped to v{latest_version}")
+    after_id = load_job_checkpoint(name)
+    if after_id:
+        logger.info(f"Resuming rewrap {name} after id {after_id}")
+    rewrapped = 0
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rewrap') as executor:
+        while True:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id, email, phone_number, ssn, address FROM employees "
+                        "WHERE id > %s ORDER BY id LIMIT %s",
+                        (after_id, chunk_size)
+                    )
+                    rows = cur.fetchall()
+                conn.commit()
+            finally:
+                release_db_connection(conn)
+            if rows:
+                after_id = rows[-1][0]
+                pending.append((after_id, executor.submit(rewrap_chunk, rows, latest_version, limiter, DECRYPT_BATCH_SIZE)))
+            # Checkpoint only ids whose chunk and every earlier chunk are done
+            while pending and (not rows or len(pending) >= workers or pending[0][1].done()):
+                last_id, future = pending.popleft()
+                rewrapped += future.result()
+                save_job_checkpoint(name, last_id)
+                logger.info(f"Rewrap {name}: {rewrapped} values rewrapped to v{latest_version}, up to id {last_id}")
+                yield {'after_id': last_id, 'rewrapped': rewrapped, 'version': latest_version, 'data_keys': data_keys}
+            if not rows:
+                break
+    save_job_checkpoint(name, 0)
+
+# flask --app app rewrap-employees
+@blueprint.cli.command('rewrap-employees')
+@click.option('--name', default='rewrap', help='Checkpoint name used to resume the job.')
+@click.option('--restart', is_flag=True, help='Discard an interrupted run and scan from the start.')
+@click.option('--chunk-size', type=int, help='Rows per chunk (default: rewrap_chunk_size from config.ini).')
+@click.option('--workers', type=int, help='Parallel workers (default: rewrap_workers from config.ini).')
+@click.option('--rps', type=float, help='Maximum Vault requests per second (default: rewrap_rps from config.ini).')
+def rewrap_employees_command(name, restart, chunk_size, workers, rps):
+    """Rewrap encrypted employee fields to the latest Transit key version."""
+    if restart:
+        save_job_checkpoint(name, 0)
+    rewrapped = data_keys = 0
+    for progress in rewrap_employees(name, chunk_size, workers, rps):
+        rewrapped, data_keys = progress['rewrapped'], progress['data_keys']
+        click.echo(f"{rewrapped} values rewrapped to v{progress['version']}, up to id {progress['after_id']}")
+    click.echo(f"Rewrap complete: {rewrapped} values and {data_keys} envelope data keys rewrapped")
+
+# csv or jsonl from an explicit format or an export file name (.csv.gz, .jsonl.gz)
+def export_format(filename, fmt=None):
+    if filename and filename.endswith('.gz'):
+        filename = filename[:-3]
+    return import_format(filename, fmt)
+
+# Rows as CSV (with a header row when header=True) or JSONL text
+def export_text(rows, headers, fmt, header=False):
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(headers)
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(dict(zip(headers, row)), default=str) + '\n')
+    return buffer.getvalue()
+
+# Decrypted employees after after_id as gzip-compressed CSV or JSONL. Rows are
+# read through a named server-side cursor STREAM_FETCH_SIZE at a time and each
+# batch is decrypted with Transit batch calls throttled to `rps` requests per
+# second, then yielded as (last id, row count, one complete gzip member).
+# Concatenated members form a valid gzip file, so memory stays flat however
+# many rows are exported and a caller can resume after the last id it wrote.
+# A batch with cells that cannot be decrypted raises DecryptionIncompleteError
+# instead of being yielded, so ciphertext never ends up in an export.
+def export_employees(fmt='csv', after_id=0, fields=EMPLOYEE_COLUMNS, rps=None, header=True):
+    limiter = RateLimiter(rps or EXPORT_RPS)
+    conn = get_db_connection()
+    try:
+        with conn.cursor(name='employees_export') as cur:
+            cur.execute(f"{employee_select(fields)} WHERE id > %s ORDER BY id", (after_id,))
+            while True:
+                rows = cur.fetchmany(STREAM_FETCH_SIZE)
+                if not rows:
+                    break
+                decrypted_rows = decrypt_rows(rows, fields, limiter=limiter, conn=conn, strict=True)
+                ROWS_SERVED.inc(len(rows), view='export')
+                data = export_text(decrypted_rows, fields, fmt, header and fmt == 'csv')
+                header = False
+                yield rows[-1][0], len(rows), gzip.compress(data.encode('utf-8'))
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+    if header:
+        # Nothing to export: still produce a valid file (with the CSV header row)
+        yield after_id, 0, gzip.compress(export_text([], fields, fmt, header=True).encode('utf-8'))
+
+# Download decrypted employees as employees.csv.gz or employees.jsonl.gz.
+# ?after_id= resumes after the last row a client received and ?fields= selects
+# columns. The first batch is read before the response starts so database and
+# decryption failures in it get an error status; a failure in a later batch
+# cuts the stream off, leaving a truncated gzip file the client can detect.
+@blueprint.route('/employees/export')
+def export_employees_download():
+    try:
+        fmt = export_format(None, request.args.get('format', 'csv'))
+        after_id = request.args.get('after_id', default=0, type=int)
+        fields = get_field_params()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    chunks = export_employees(fmt, after_id, fields, header=not after_id)
+    try:
+        first = next(chunks, None)
+    except Exception as e:
+        logger.error(f"Error exporting employees: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    def body():
+        exported = 0
+        try:
+            if first is not None:
+                exported += first[1]
+                yield first[2]
+            for _, count, data in chunks:
+                exported += count
+                yield data
+        except Exception as e:
+            logger.error(f"Export failed after {exported} rows: {str(e)}")
+            raise
+        logger.info(f"Exported {exported} employees as {fmt}")
+
+    return Response(body(), mimetype='application/gzip',
+                    headers={'Content-Disposition': f'attachment; filename=employees.{fmt}.gz',
+                             'Cache-Control': 'no-store'})
+
+# flask --app app export-employees employees.csv.gz
+@blueprint.cli.command('export-employees')
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Output format (default: from the file extension).')
+@click.option('--fields', help='Comma-separated columns to export (default: all).')
+@click.option('--name', default='export', help='Checkpoint name used to resume an interrupted export.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and export from the start.')
+@click.option('--after-id', type=int, help='Export only employees with a greater id (overrides the checkpoint).')
+@click.option('--rps', type=float, help='Maximum Vault requests per second (default: export_rps from config.ini).')
+def export_employees_command(output, fmt, fields, name, restart, after_id, rps):
+    """Export decrypted employees to a gzip-compressed CSV or JSONL file."""
+    fmt = export_format(output, fmt)
+    fields = parse_fields(fields)
+    if after_id is None:
+        after_id = 0 if restart else load_job_checkpoint(name)
+        if after_id:
+            click.echo(f"Resuming export {name} after id {after_id}, appending to {output}")
+    exported = 0
+    # Each gzip member goes to disk in a single unbuffered write and is synced
+    # before the checkpoint moves past it; after a crash, at most the last batch
+    # is written twice.
+    # A batch that fails to decrypt stops the export with the checkpoint still
+    # at the last batch written, so a rerun resumes with that batch.
+    with open(output, 'ab' if after_id else 'wb', buffering=0) as f:
+        try:
+            for last_id, count, data in export_employees(fmt, after_id, fields, rps, header=not after_id):
+                f.write(data)
+                os.fsync(f.fileno())
+                save_job_checkpoint(name, last_id)
+                exported += count
+                click.echo(f"{exported} employees exported, up to id {last_id}")
+        except DecryptionIncompleteError as e:
+            raise click.ClickException(f"Export stopped after {exported} employees: {e}")
+    # A finished export starts from the beginning next time
+    save_job_checkpoint(name, 0)
+    click.echo(f"Export complete: {exported} employees written to {output}")
+
+# (Re)build the Vault client, credential manager, pools, caches and workers
+# from the current settings. Nothing here does I/O or starts threads: Vault
+# connections, DB connections and worker threads are all created on first use.
+def init_resources():
+    global vault_client, vault_readiness, credential_flights, decrypt_flights, credential_manager, db_pool, \
+           decrypt_cache, key_version_check, mask_cache, page_cache, decrypt_executor, envelope_keyring, submission_queue, \
+           blind_index_key, transform_unavailable_until
+    vault_client = VaultClient(VAULT_ADDR, VAULT_TOKEN, pool_size=VAULT_POOL_SIZE,
+                               connect_timeout=VAULT_CONNECT_TIMEOUT, read_timeout=VAULT_READ_TIMEOUT,
+                               max_retries=VAULT_MAX_RETRIES, retry_backoff=VAULT_RETRY_BACKOFF,
+                               circuit_threshold=VAULT_CIRCUIT_THRESHOLD, probe_interval=VAULT_CIRCUIT_PROBE_INTERVAL)
+    vault_readiness = ReadinessCheck(VAULT_READY_INTERVAL, VAULT_READY_TIMEOUT)
+    credential_flights = SingleFlight('credentials')
+    decrypt_flights = SingleFlight('decrypt')
+    credential_manager = DbCredentialManager(LEASE_REFRESH_FRACTION, CREDENTIALS_GRACE)
+    db_pool = RotatingConnectionPool(credential_manager, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+                                     DB_POOL_HEALTH_CHECK_AFTER)
+    # Plaintexts of Transit ciphertexts, correct until their key version is retired
+    decrypt_cache = TTLCache(
+        DECRYPT_CACHE_ENTRIES, DECRYPT_CACHE_TTL, max_bytes=DECRYPT_CACHE_BYTES,
+        sizer=lambda key, value: len(key) + len(value.encode('utf-8')), grace=DECRYPT_STALE_GRACE
+    )
+    key_version_check = KeyVersionCheck(DECRYPT_KEY_CHECK_INTERVAL)
+    # Decoded last-four masks keyed by (transformation, token)
+    mask_cache = TTLCache(MASK_CACHE_ENTRIES, MASK_CACHE_TTL)
+    # Rendered encrypted-view pages keyed by (ETag, whether the page was full)
+    page_cache = TTLCache(PAGE_CACHE_ENTRIES, PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_BYTES,
+                          sizer=lambda key, value: len(value.encode('utf-8')))
+    # Worker pool for concurrent Transit decrypt calls
+    decrypt_executor = ThreadPoolExecutor(max_workers=DECRYPT_WORKERS, thread_name_prefix='decrypt')
+    envelope_keyring = EnvelopeKeyring(DATA_KEY_TTL, DATA_KEY_MAX_USES, DATA_KEY_CACHE_SIZE)
+    blind_index_key = BlindIndexKey(BLIND_INDEX_KEY, BLIND_INDEX_KEY_VERSION)
+    transform_unavailable_until = 0.0
+    submission_queue = SubmissionQueue(WRITE_BEHIND_QUEUE_MAX, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_INTERVAL,
+                                       WRITE_BEHIND_MAX_ATTEMPTS)
+
+init_resources()
+
+# Close pooled DB connections and let idle decrypt workers exit
+def close_resources():
+    decrypt_executor.shutdown(wait=False)
+    db_pool.close()
+
+atexit.register(close_resources)
+
+# A forked worker (gunicorn --preload, multiprocessing) inherits the parent's
+# sockets and locks but none of its threads. Drop the inherited objects without
+# closing them, since the connections still belong to the parent, and start over.
+def _reinit_after_fork():
+    logging_configured = log_listener is not None
+    init_resources()
+    if logging_configured:
+        configure_logging(LOG_LEVEL, LOG_FILE)
+    if WRITE_BEHIND:
+        submission_queue.start()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+# Application factory. config is a path to an ini file read on top of
+# config.ini, or a mapping of setting overrides such as {'VAULT_ADDR': ...}.
+# Building the app does no blocking I/O: the Vault health check runs in the
+# background and is reported by /ready.
+def create_app(config=None):
+    load_config(DEFAULT_CONFIG)
+    if isinstance(config, str):
+        load_config(config)
+    elif config is not None:
+        unknown = [name for name in config if not name.isupper() or name not in globals()]
+        if unknown:
+            raise KeyError(f"Unknown settings: {', '.join(unknown)}")
+        globals().update(config)
+    init_resources()
+
+    configure_logging(LOG_LEVEL, LOG_FILE)
+    sampled_logger.interval = LOG_DEBUG_SAMPLE_INTERVAL
+    flask_app = Flask(__name__)
+    flask_app.jinja_loader = ChoiceLoader([DictLoader(TEMPLATES), flask_app.jinja_loader])
+    flask_app.register_blueprint(blueprint)
+    for template_name in TEMPLATES:
+        flask_app.jinja_env.get_template(template_name)
+
+    vault_readiness.refresh()
+    if WRITE_BEHIND:
+        # Pick up submissions left pending by a previous run
+        submission_queue.start()
+    return flask_app
+
+# `gunicorn app:app`, `flask --app app` and `import app; app.app` still work;
+# the default app is only built the first time it is asked for
+def __getattr__(name):
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    create_app().run(host='0.0.0.0', port=5000)
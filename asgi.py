@@ -0,0 +1,573 @@
+# Async ASGI entry point for the three hot pages: Add Employee (/), View
+# Employees (/employees) and Encrypted View (/employees/encrypted). Vault is
+# called through httpx.AsyncClient and Postgres through asyncpg, so the Transit
+# batches of many rows and many concurrent requests are in flight at once on
+# one event loop instead of each holding a worker thread. Every other route
+# (search, masked view, import, /metrics, /ready, ...) is served by the Flask
+# app through uvicorn's WSGI adapter.
+#
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+#
+# Needs httpx, asyncpg and uvicorn in addition to the Flask app's dependencies.
+import asyncio
+import base64
+import logging
+import random
+import time
+from urllib.parse import parse_qs, urlencode
+
+from jinja2 import DictLoader, Environment, select_autoescape
+from markupsafe import escape
+from werkzeug.http import parse_etags
+
+import app as core
+
+# httpx and asyncpg are only needed for the async serving mode
+try:
+    import asyncpg
+    import httpx
+except ImportError:
+    asyncpg = None
+    httpx = None
+
+try:
+    from uvicorn.middleware.wsgi import WSGIMiddleware
+except ImportError:
+    WSGIMiddleware = None
+
+logger = logging.getLogger(__name__)
+
+# Paths of the Flask endpoints the shared templates link to
+ROUTES = {
+    'employees.add_employee': '/',
+    'employees.view_employees': '/employees',
+    'employees.view_encrypted_employees': '/employees/encrypted',
+    'employees.view_masked_employees': '/employees/masked',
+    'employees.search_employees': '/employees/search',
+}
+ROUTES_BY_PATH = {path: endpoint for endpoint, path in ROUTES.items()}
+
+# Async Vault HTTP client with the same timeouts, retry policy and circuit
+# breaker as core.VaultClient
+class AsyncVaultClient:
+    RETRY_STATUSES = core.VaultClient.RETRY_STATUSES
+
+    def __init__(self, addr, token, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, retry_backoff=None):
+        self.max_retries = core.VAULT_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = core.VAULT_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        pool_size = pool_size or core.VAULT_POOL_SIZE
+        self.client = httpx.AsyncClient(
+            base_url=f"{addr.rstrip('/')}/v1/",
+            headers={'X-Vault-Token': token, 'Content-Type': 'application/json'},
+            timeout=httpx.Timeout(read_timeout or core.VAULT_READ_TIMEOUT,
+                                  connect=connect_timeout or core.VAULT_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        # The breaker's timer probes with the sync client from its own thread
+        self.breaker = core.CircuitBreaker(core.vault_client._probe, core.VAULT_CIRCUIT_THRESHOLD,
+                                           core.VAULT_CIRCUIT_PROBE_INTERVAL)
+
+    async def request(self, method, path, retries=None, **kwargs):
+        if self.breaker.is_open:
+            raise core.VaultUnavailableError(f"Vault circuit is open, not sending {method} {path}")
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                response = await self.client.request(method, path.lstrip('/'), **kwargs)
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    self.breaker.record_failure()
+                    raise
+                logger.warning(f"Vault {method} {path} failed ({str(e)}), retrying")
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                if attempt == retries:
+                    self.breaker.record_failure()
+                    return response
+                logger.warning(f"Vault {method} {path} returned {response.status_code}, retrying")
+            await asyncio.sleep(self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+# Vault and Postgres access for the async pages. Holds the asyncpg pool opened
+# with the current dynamic credentials. Like core.DbCredentialManager, once the
+# lease is due for a refresh it is renewed (or the pool replaced) by a background
+# task while callers keep using the current pool; they only wait when there is
+# no usable pool. Concurrent decrypts of the same ciphertext share one call.
+class AsyncEmployeeService:
+    def __init__(self):
+        self.vault = None
+        self.pool = None
+        self._lease = None
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+        self._pool_lock = None
+        self._refresh_task = None
+        self._inflight = {}  # ciphertext -> future of its plaintext (None on failure)
+
+    async def start(self):
+        if httpx is None or asyncpg is None:
+            raise RuntimeError("The async serving mode needs the httpx and asyncpg packages")
+        self.vault = AsyncVaultClient(core.VAULT_ADDR, core.VAULT_TOKEN)
+        self._pool_lock = asyncio.Lock()
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        if self.pool is not None:
+            await self.pool.close()
+        if self.vault is not None:
+            await self.vault.aclose()
+
+    @core.observe_vault('credentials')
+    async def fetch_db_credentials(self):
+        response = await self.vault.get(core.VAULT_DB_CREDS_PATH)
+        response.raise_for_status()
+        data = response.json()
+        return {
+            'username': data['data']['username'],
+            'password': data['data']['password'],
+            'lease_id': data.get('lease_id'),
+            'lease_duration': data.get('lease_duration') or 0,
+            'renewable': data.get('renewable', False),
+        }
+
+    @core.observe_vault('lease_renew')
+    async def renew_db_lease(self, lease_id, increment):
+        response = await self.vault.put("sys/leases/renew", json={'lease_id': lease_id, 'increment': increment})
+        response.raise_for_status()
+        return response.json().get('lease_duration') or 0
+
+    def _set_lease(self, lease, now):
+        ttl = lease['lease_duration']
+        self._lease = lease
+        self._refresh_at = now + ttl * core.LEASE_REFRESH_FRACTION if ttl else float('inf')
+        self._expires_at = now + ttl if ttl else float('inf')
+
+    # Renew the lease if possible, otherwise issue new credentials and swap in a
+    # pool for them; the old pool closes once its connections are released
+    async def _rotate(self):
+        lease = self._lease
+        if lease and lease['renewable'] and lease['lease_id']:
+            try:
+                ttl = await self.renew_db_lease(lease['lease_id'], lease['lease_duration'])
+                if ttl >= lease['lease_duration'] * (1 - core.LEASE_REFRESH_FRACTION):
+                    self._set_lease(dict(lease, lease_duration=ttl), time.monotonic())
+                    return
+            except Exception as e:
+                logger.warning(f"Lease renewal failed, issuing new credentials: {str(e)}")
+        creds = await self.fetch_db_credentials()
+        pool = await asyncpg.create_pool(
+            host=core.DB_HOST, port=int(core.DB_PORT), database=core.DB_NAME,
+            user=creds['username'], password=creds['password'],
+            min_size=core.DB_POOL_MIN, max_size=core.DB_POOL_MAX,
+        )
+        old, self.pool = self.pool, pool
+        self._set_lease(creds, time.monotonic())
+        logger.info(f"Opened async connection pool for {creds['username']}")
+        if old is not None:
+            asyncio.get_running_loop().create_task(old.close())
+
+    async def _refresh(self):
+        try:
+            async with self._pool_lock:
+                if time.monotonic() >= self._refresh_at:
+                    await self._rotate()
+        except Exception as e:
+            logger.error(f"Background credential refresh failed: {str(e)}")
+            self._refresh_at = min(time.monotonic() + 5.0, self._expires_at)
+        finally:
+            self._refresh_task = None
+
+    async def get_pool(self):
+        now = time.monotonic()
+        if self.pool is not None and now < self._expires_at:
+            if now >= self._refresh_at and self._refresh_task is None:
+                self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+            return self.pool
+        # No usable pool: one coroutine rotates; the others wait on the lock and reuse its pool
+        async with self._pool_lock:
+            now = time.monotonic()
+            if self.pool is None or now >= self._refresh_at:
+                try:
+                    await self._rotate()
+                except Exception:
+                    if self.pool is None or now >= self._expires_at + core.CREDENTIALS_GRACE:
+                        raise
+                    self._refresh_at = min(now + 5.0, self._expires_at + core.CREDENTIALS_GRACE)
+                    logger.warning("Keeping the current DB pool while Vault is unavailable")
+            return self.pool
+
+    async def transit_batch(self, path, batch_input, parse, action):
+        if not batch_input:
+            return []
+        try:
+            response = await self.vault.post(path, json={'batch_input': batch_input})
+        except Exception as e:
+            logger.error(f"Batch {action} failed: {str(e)}")
+            raise
+        return core.parse_batch_results(response, batch_input, parse, action)
+
+    @core.observe_vault('encrypt')
+    async def encrypt_many(self, values):
+        batch_input = [{'plaintext': base64.b64encode(value.encode('utf-8')).decode('utf-8')} for value in values]
+        return await self.transit_batch(f"transit/encrypt/{core.ENCRYPTION_KEY}", batch_input,
+                                        lambda item: item['ciphertext'], 'encryption')
+
+    async def encrypt_fields(self, values):
+        if core.ENCRYPTION_MODE == 'envelope':
+            return await asyncio.to_thread(core.envelope_encrypt_many, values)
+        return await self.encrypt_many(values)
+
+    # Blind indexes are computed locally; only deriving their key, once per
+    # process, goes to Vault
+    async def blind_indexes(self, email, ssn):
+        if not core.blind_index_key.ready():
+            await asyncio.to_thread(core.blind_index_key.get)
+        return core.blind_indexes([(email, ssn)])[0]
+
+    # Same contract as core.mask_tokens: a failed token is None, never an error,
+    # and nothing is sent while masking is disabled or Transform is unavailable.
+    async def mask_tokens(self, ssn, phone):
+        if not core.masking_enabled():
+            return None, None
+        return await self._encode_masks(ssn, phone)
+
+    # Both values go out in one Transform batch call
+    @core.observe_vault('transform')
+    async def _encode_masks(self, ssn, phone):
+        batch_input = [{'value': core.normalize_ssn(ssn), 'transformation': core.SSN_TRANSFORMATION},
+                       {'value': core.normalize_phone(phone), 'transformation': core.PHONE_TRANSFORMATION}]
+        try:
+            return tuple(await self.transit_batch("transform/encode/masking-role", batch_input,
+                                                  lambda item: item['encoded_value'], 'transform encoding'))
+        except core.VaultBatchError as e:
+            return tuple(e.results)
+        except Exception as e:
+            if not core.note_transform_failure(e):
+                logger.error(f"Masking failed: {str(e)}")
+            return None, None
+
+    @core.observe_vault('decrypt')
+    async def _decrypt_batch(self, ciphertexts):
+        batch_input = [{'ciphertext': ciphertext} for ciphertext in ciphertexts]
+        return await self.transit_batch(f"transit/decrypt/{core.ENCRYPTION_KEY}", batch_input,
+                                        lambda item: base64.b64decode(item['plaintext']).decode('utf-8'),
+                                        'decryption')
+
+    # Cache-aware decrypt with the same results and VaultBatchError contract as
+    # core.vault_decrypt_many, sharing core.decrypt_cache
+    async def decrypt_many(self, ciphertexts):
+        core.key_version_check.refresh()
+        plaintexts = [core.decrypt_cache.get(ciphertext) for ciphertext in ciphertexts]
+        misses = list(dict.fromkeys(c for c, p in zip(ciphertexts, plaintexts) if p is None))
+        if not misses:
+            return plaintexts
+        loop = asyncio.get_running_loop()
+        joined = {c: self._inflight[c] for c in misses if c in self._inflight}
+        owned = [c for c in misses if c not in joined]
+        for ciphertext in owned:
+            self._inflight[ciphertext] = loop.create_future()
+        if joined:
+            core.VAULT_COALESCED.inc(len(joined), operation='decrypt')
+        resolved = {}
+        stale = False
+        try:
+            try:
+                fetched = await self._decrypt_batch(owned) if owned else []
+            except core.VaultBatchError as e:
+                fetched = e.results
+            except Exception as e:
+                fetched = [core.decrypt_cache.get_stale(ciphertext) for ciphertext in owned]
+                served = sum(1 for plaintext in fetched if plaintext is not None)
+                if not served:
+                    raise
+                stale = True
+                core.VAULT_STALE_SERVED.inc(served, kind='plaintext')
+                logger.warning(f"Serving {served} stale plaintexts while Vault is unavailable: {str(e)}")
+            for ciphertext, plaintext in zip(owned, fetched):
+                if plaintext is not None:
+                    if not stale:
+                        core.decrypt_cache.set(ciphertext, plaintext)
+                    resolved[ciphertext] = plaintext
+        finally:
+            # Followers must never wait on a call that was abandoned
+            for ciphertext in owned:
+                future = self._inflight.pop(ciphertext)
+                if not future.done():
+                    future.set_result(resolved.get(ciphertext))
+        for ciphertext, future in joined.items():
+            plaintext = await asyncio.shield(future)
+            if plaintext is not None:
+                resolved[ciphertext] = plaintext
+        errors = {}
+        for index, ciphertext in enumerate(ciphertexts):
+            if plaintexts[index] is None:
+                plaintexts[index] = resolved.get(ciphertext)
+                if plaintexts[index] is None:
+                    errors[index] = 'decryption failed'
+        if errors:
+            raise core.VaultBatchError(f"Decryption failed for {len(errors)} of {len(ciphertexts)} items",
+                                       plaintexts, errors)
+        return plaintexts
+
+    # Async counterpart of core.decrypt_rows: every chunk's Transit call is in
+    # flight at once; envelope cells are decrypted on a worker thread
+    async def decrypt_rows(self, rows, headers, batch_size=None):
+        batch_size = batch_size or core.DECRYPT_BATCH_SIZE
+        decrypted_rows = [list(row) for row in rows]
+        cells, envelope_cells = core.encrypted_cells(decrypted_rows, headers)
+
+        async def decrypt_chunk(chunk):
+            try:
+                return chunk, await self.decrypt_many([value for _, _, value in chunk])
+            except core.VaultBatchError as e:
+                return chunk, e.results
+            except Exception as e:
+                logger.error(f"Decryption error for {len(chunk)} cells: {str(e)}")
+                return chunk, [None] * len(chunk)
+
+        results = await asyncio.gather(*(decrypt_chunk(cells[start:start + batch_size])
+                                         for start in range(0, len(cells), batch_size)))
+        if envelope_cells:
+            envelope = asyncio.to_thread(core.envelope_decrypt_many, [value for _, _, value in envelope_cells])
+            results.append((envelope_cells, await envelope))
+        for chunk, plaintexts in results:
+            for (r, c, _), plaintext in zip(chunk, plaintexts):
+                if plaintext is not None:
+                    decrypted_rows[r][c] = plaintext
+        return decrypted_rows
+
+# Minimal request object for the shared templates, which read request.path
+class TemplateRequest:
+    def __init__(self, path):
+        self.path = path
+
+templates = Environment(loader=DictLoader(core.TEMPLATES), autoescape=select_autoescape(['html']),
+                        enable_async=True)
+templates.filters['table_cells'] = core.table_cells
+templates.globals['url_for'] = lambda endpoint, **values: ROUTES[endpoint]
+
+def page_params(query):
+    def number(name, default):
+        try:
+            return int(query.get(name, [default])[0])
+        except ValueError:
+            return default
+    limit = number('limit', core.PAGE_SIZE)
+    return number('after_id', 0), max(1, min(limit, core.MAX_PAGE_SIZE))
+
+# core.ENCRYPTED_PAGE_TOKEN with asyncpg placeholders
+PAGE_TOKEN_QUERY = core.ENCRYPTED_PAGE_TOKEN % ('$1', '$2')
+
+class AsyncEmployeeApp:
+    def __init__(self, fallback=None):
+        self.service = AsyncEmployeeService()
+        self.fallback = fallback
+        self.routes = {
+            '/': self.add_employee,
+            '/employees': self.view_employees,
+            '/employees/encrypted': self.view_encrypted_employees,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        handler = self.routes.get(scope['path']) if scope['type'] == 'http' else None
+        if handler is None:
+            if self.fallback is None:
+                return await self.respond(send, 404, 'Not Found', 'text/plain')
+            return await self.fallback(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+        try:
+            status = await handler(scope, receive, send)
+        finally:
+            core.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                              endpoint=ROUTES_BY_PATH[scope['path']], status=status)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.service.start()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.service.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def respond(send, status, body, content_type='text/html; charset=utf-8', headers=()):
+        body = body.encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', content_type.encode('latin-1'))] +
+                               [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+        await send({'type': 'http.response.body', 'body': body})
+        return status
+
+    @staticmethod
+    async def read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    @staticmethod
+    async def render_page(path, template, **context):
+        return await templates.get_template(template).render_async(request=TemplateRequest(path), **context)
+
+    async def render(self, send, path, template, status=200, response_headers=(), **context):
+        page = await self.render_page(path, template, **context)
+        return await self.respond(send, status, page, headers=response_headers)
+
+    async def render_error(self, send, path, message):
+        return await self.render(send, path, 'layout.html',
+                                 content=f'<div class="message error">{escape(message)}</div>')
+
+    async def add_employee(self, scope, receive, send):
+        msg = ''
+        status, response_headers = 200, ()
+        if scope['method'] == 'POST':
+            form = {k: v[0] for k, v in parse_qs((await self.read_body(receive)).decode('utf-8')).items()}
+            name, role, email, phone, ssn, address = (form.get(field, '') for field in
+                                                      ('name', 'role', 'email', 'phone', 'ssn', 'address'))
+            if not all([name, role, email, phone, ssn, address]):
+                msg = '<div class="message error">All fields are required!</div>'
+            elif core.WRITE_BEHIND:
+                try:
+                    submission_id = await asyncio.to_thread(core.submission_queue.enqueue,
+                                                            name, role, email, phone, ssn, address)
+                    msg = f'<div class="message success">Employee {escape(name)} queued as submission <a href="/employees/submissions/{submission_id}">{submission_id}</a>!</div>'
+                except core.QueueFullError as e:
+                    logger.warning(str(e))
+                    msg = '<div class="message error">Too many pending submissions, please try again shortly.</div>'
+                    status, response_headers = 503, (('Retry-After', '5'),)
+                except Exception as e:
+                    logger.error(f"Error queueing employee: {str(e)}")
+                    msg = f'<div class="message error">Error: {escape(str(e))}</div>'
+            else:
+                try:
+                    # Encryption, blind indexes and masking tokens are independent Vault calls
+                    encrypted, (email_bidx, ssn_bidx), (ssn_fpe, phone_fpe) = await asyncio.gather(
+                        self.service.encrypt_fields([email, phone, ssn, address]),
+                        self.service.blind_indexes(email, ssn),
+                        self.service.mask_tokens(ssn, phone),
+                    )
+                    pool = await self.service.get_pool()
+                    emp_id = await pool.fetchval(
+                        "INSERT INTO employees (id, name, role, email, phone_number, ssn, address, email_bidx, ssn_bidx, "
+                        "ssn_fpe, phone_fpe) VALUES (DEFAULT, $1, $2, $3, $4, $5, $6, $7, $8, $9, $10) RETURNING id",
+                        name, role, *encrypted, email_bidx, ssn_bidx, ssn_fpe, phone_fpe)
+                    core.invalidate_page_cache()
+                    logger.info(f"Employee {name} added successfully with ID {emp_id}")
+                    msg = f'<div class="message success">Employee {escape(name)} added successfully with ID {emp_id}!</div>'
+                except Exception as e:
+                    logger.error(f"Error adding employee: {str(e)}")
+                    msg = f'<div class="message error">Error: {escape(str(e))}</div>'
+        return await self.render(send, '/', 'layout.html', status=status, response_headers=response_headers,
+                                 content=msg + core.EMPLOYEE_FORM_HTML)
+
+    @staticmethod
+    def query_params(scope):
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        after_id, limit = page_params(query)
+        return after_id, limit, core.parse_fields(query.get('fields', [''])[0])
+
+    @staticmethod
+    async def fetch_rows(conn, after_id, limit, fields):
+        statement = await conn.prepare(f"{core.employee_select(fields)} WHERE id > $1 ORDER BY id LIMIT $2")
+        rows = await statement.fetch(after_id, limit)
+        headers = [attribute.name for attribute in statement.get_attributes()]
+        return [tuple(row) for row in rows], headers
+
+    async def fetch_page(self, scope):
+        after_id, limit, fields = self.query_params(scope)
+        pool = await self.service.get_pool()
+        async with pool.acquire() as conn:
+            rows, headers = await self.fetch_rows(conn, after_id, limit, fields)
+        return rows, headers, limit
+
+    def next_url(self, scope, rows, limit):
+        if limit and len(rows) == limit:
+            params = {'after_id': rows[-1][0], 'limit': limit}
+            fields = parse_qs(scope['query_string'].decode('latin-1')).get('fields')
+            if fields:
+                params['fields'] = fields[0]
+            return f"{scope['path']}?{urlencode(params)}"
+        return None
+
+    async def view_employees(self, scope, receive, send):
+        try:
+            rows, headers, limit = await self.fetch_page(scope)
+            decrypted_rows = await self.service.decrypt_rows(rows, headers)
+            core.ROWS_SERVED.inc(len(rows), view='employees')
+            return await self.render(send, scope['path'], 'employee_table.html', title='Employee Records',
+                                     headers=headers, batches=[decrypted_rows],
+                                     next_url=self.next_url(scope, rows, limit))
+        except Exception as e:
+            logger.error(f"Error fetching employees: {str(e)}")
+            return await self.render_error(send, scope['path'], f"Error fetching data: {str(e)}")
+
+    # Same change token, ETag and page_cache as the Flask view, so both serving
+    # modes answer each other's If-None-Match
+    async def view_encrypted_employees(self, scope, receive, send):
+        try:
+            after_id, limit, fields = self.query_params(scope)
+            pool = await self.service.get_pool()
+            async with pool.acquire() as conn:
+                token = tuple(await conn.fetchrow(PAGE_TOKEN_QUERY, after_id, limit))
+                etag = core.page_etag(scope['path'], token, after_id, limit, fields)
+                headers = [('etag', f'"{etag}"'), ('cache-control', 'private, no-cache')]
+                if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode('latin-1')
+                if parse_etags(if_none_match).contains(etag):
+                    await send({'type': 'http.response.start', 'status': 304,
+                                'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+                    await send({'type': 'http.response.body', 'body': b''})
+                    return 304
+                full = token[0] == limit
+                page = core.page_cache.get((etag, full))
+                if page is None:
+                    rows, row_headers = await self.fetch_rows(conn, after_id, limit, fields)
+                    core.ROWS_SERVED.inc(len(rows), view='employees_encrypted')
+                    page = await self.render_page(scope['path'], 'employee_table.html',
+                                                  title='Encrypted Employee Records', headers=row_headers,
+                                                  batches=[rows], next_url=self.next_url(scope, rows, limit))
+                    core.page_cache.set((etag, full), page)
+            return await self.respond(send, 200, page, headers=headers)
+        except Exception as e:
+            logger.error(f"Error fetching encrypted employees: {str(e)}")
+            return await self.render_error(send, scope['path'], f"Error fetching data: {str(e)}")
+
+# Build the ASGI app. Routes other than the three async pages go to the Flask
+# app from core.create_app() when uvicorn's WSGI adapter is available.
+def create_asgi_app(config=None):
+    flask_app = core.create_app(config)
+    fallback = WSGIMiddleware(flask_app) if WSGIMiddleware is not None else None
+    return AsyncEmployeeApp(fallback)
+
+# `uvicorn asgi:application`; built on first access like app.app
+def __getattr__(name):
+    if name == 'application':
+        globals()['application'] = create_asgi_app()
+        return globals()['application']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
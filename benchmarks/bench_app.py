@@ -0,0 +1,296 @@
+# End-to-end throughput and latency of add_employee, view_employees,
+# view_encrypted_employees and view_masked_employees against the in-process fake Vault (fake_vault.py),
+# so Vault round trips, batching and rendering can be measured offline.
+#
+# By default the database is a SQLite stand-in that speaks just enough of the
+# psycopg2 connection API for these three routes. Pass --dsn-host (and the
+# other --dsn-* options) to run against a local Postgres with the schema from
+# the README instead; the fake Vault then issues --db-user/--db-password as the
+# dynamic credentials. Rows are appended, never deleted, so use a scratch
+# database.
+#
+#   python benchmarks/bench_app.py --rows 100 1000 5000 --requests 50 --latency 0.002
+#   python benchmarks/bench_app.py --dsn-host localhost --db-user bench --db-password bench
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)  # app.py reads config.ini from the working directory
+
+import app as employee_app  # noqa: E402
+from fake_vault import FakeVault  # noqa: E402
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS employees (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    ssn TEXT NOT NULL,
+    address TEXT NOT NULL,
+    email_bidx TEXT,
+    ssn_bidx TEXT,
+    ssn_fpe TEXT,
+    phone_fpe TEXT
+);
+'''
+
+# Stand-in for employee_app.ENCRYPTED_PAGE_TOKEN: SQLite has no xmin, md5 or
+# string_agg, so the page's rows themselves (read in id order) are the token
+SQLITE_PAGE_TOKEN = (
+    "SELECT count(*), max(id), group_concat(id || ':' || name || ':' || role || ':' || email || ':' || "
+    "phone_number || ':' || ssn || ':' || address, ',') "
+    "FROM (SELECT * FROM employees WHERE id > ? ORDER BY id LIMIT ?) AS page"
+)
+
+
+class SqliteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @staticmethod
+    def _translate(query):
+        if query == employee_app.ENCRYPTED_PAGE_TOKEN:
+            return SQLITE_PAGE_TOKEN
+        return query.replace('VALUES (DEFAULT, ', 'VALUES (NULL, ').replace('%s', '?')
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self._translate(query), tuple(params or ()))
+
+    def executemany(self, query, seq):
+        self._cursor.executemany(self._translate(query), [tuple(params) for params in seq])
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    closed = 0
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+
+    # Named (server-side) cursors have no SQLite equivalent; fetchmany on a
+    # plain cursor streams the same way
+    def cursor(self, name=None):
+        return SqliteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+# Drop-in for employee_app.db_pool backed by SQLite connections
+class SqlitePool:
+    def __init__(self, path):
+        self.path = path
+        self._idle = []
+        self._lock = threading.Lock()
+        with sqlite3.connect(path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SQLITE_SCHEMA)
+
+    def getconn(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return SqliteConnection(self.path)
+
+    def putconn(self, conn, close=False):
+        with self._lock:
+            self._idle.append(conn)
+
+    def stats(self):
+        return {'backend': 'sqlite', 'idle': len(self._idle)}
+
+    def close(self):
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle.clear()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+# Insert count encrypted rows straight into the table; returns the id just
+# before the first new row so the views can be pointed at exactly these rows
+def seed(count, batch_size=500):
+    conn = employee_app.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM employees")
+            start_after = cur.fetchone()[0]
+        for offset in range(0, count, batch_size):
+            people = range(start_after + offset + 1, start_after + min(count, offset + batch_size) + 1)
+            plaintexts = []
+            for i in people:
+                plaintexts += [f"employee{i}@example.com", f"555{i:07d}"[-10:], f"{i:09d}"[-9:], f"{i} Main St"]
+            ciphertexts = employee_app.vault_encrypt_many(plaintexts)
+            masks = employee_app.mask_tokens([(plaintexts[j * 4 + 2], plaintexts[j * 4 + 1]) for j in range(len(people))])
+            with conn.cursor() as cur:
+                cur.executemany(
+                    "INSERT INTO employees (name, role, email, phone_number, ssn, address, ssn_fpe, phone_fpe) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                    [(f"Employee {i}", 'Engineer', *ciphertexts[j * 4:j * 4 + 4], *masks[j]) for j, i in enumerate(people)])
+            conn.commit()
+        return start_after
+    finally:
+        employee_app.release_db_connection(conn)
+
+
+def run(flask_app, label, rows, requests, concurrency, call, vault, warm_cache):
+    clients = threading.local()
+
+    def one(i):
+        if not hasattr(clients, 'client'):
+            clients.client = flask_app.test_client()
+        if not warm_cache:
+            employee_app.decrypt_cache.clear()
+            employee_app.mask_cache.clear()
+        start = time.perf_counter()
+        ok = call(clients.client, i)
+        return time.perf_counter() - start, ok
+
+    call(flask_app.test_client(), -1)  # warm up connections and templates
+    vault.reset_counts()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'operation': label,
+        'rows': rows,
+        'requests': requests,
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput_rps': requests / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'vault_calls_per_request': sum(vault.requests.values()) / requests,
+    }
+
+
+def scenarios(start_after, count):
+    page = min(count, employee_app.MAX_PAGE_SIZE)
+
+    def view(path):
+        def call(client, i):
+            response = client.get(path)
+            body = response.get_data(as_text=True)
+            return response.status_code == 200 and 'message error' not in body
+        return call
+
+    def add(client, i):
+        response = client.post('/', data={
+            'name': f"Bench {i}", 'role': 'Engineer', 'email': f"bench{i}@example.com",
+            'phone': '5551234567', 'ssn': '123456789', 'address': f"{i} Bench St",
+        })
+        return response.status_code == 200 and 'message success' in response.get_data(as_text=True)
+
+    return [
+        ('view_employees', view(f"/employees?after_id={start_after}&limit={page}")),
+        ('view_employees?stream', view(f"/employees?stream=1&after_id={start_after}")),
+        ('view_encrypted', view(f"/employees/encrypted?after_id={start_after}&limit={page}")),
+        ('view_encrypted?stream', view(f"/employees/encrypted?stream=1&after_id={start_after}")),
+        ('view_masked', view(f"/employees/masked?after_id={start_after}&limit={page}")),
+        ('add_employee', add),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark against a fake Vault.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--requests', type=int, default=30, help='timed requests per operation and row count')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.001, help='fake Vault latency per request (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of Vault requests failing with 503')
+    parser.add_argument('--item-error-rate', type=float, default=0.0, help='fraction of batch items failing')
+    parser.add_argument('--warm-cache', action='store_true', help='keep the decrypt and mask caches between requests')
+    parser.add_argument('--dsn-host', help='use this Postgres host instead of the SQLite stand-in')
+    parser.add_argument('--dsn-port', type=int, default=5432)
+    parser.add_argument('--dsn-name', default='employees')
+    parser.add_argument('--db-user', default='bench')
+    parser.add_argument('--db-password', default='bench')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    vault = FakeVault(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      item_error_rate=args.item_error_rate, db_username=args.db_user,
+                      db_password=args.db_password).start()
+    settings = {'VAULT_ADDR': vault.url, 'VAULT_TOKEN': 'bench-token', 'WRITE_BEHIND': False, 'MASKING': True,
+                'ENCRYPTION_MODE': 'transit', 'LOG_LEVEL': args.log_level, 'LOG_FILE': ''}
+    if args.dsn_host:
+        settings.update(DB_HOST=args.dsn_host, DB_PORT=args.dsn_port, DB_NAME=args.dsn_name)
+    flask_app = employee_app.create_app(settings)
+
+    tmpdir = None
+    if not args.dsn_host:
+        tmpdir = tempfile.TemporaryDirectory()
+        employee_app.db_pool = SqlitePool(os.path.join(tmpdir.name, 'employees.db'))
+
+    if not args.json:
+        print(f"fake Vault at {vault.url}, latency {args.latency * 1000:.1f} ms, "
+              f"database {'postgres://' + args.dsn_host if args.dsn_host else 'sqlite stand-in'}")
+        print(f"{'operation':<24} {'rows':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'vault/req':>10} {'errors':>7}")
+    try:
+        for count in args.rows:
+            # Seed without injected failures; they only apply to the timed requests
+            vault.error_rate = vault.item_error_rate = 0.0
+            start_after = seed(count)
+            vault.error_rate, vault.item_error_rate = args.error_rate, args.item_error_rate
+            for label, call in scenarios(start_after, count):
+                result = run(flask_app, label, count, args.requests, args.concurrency, call, vault, args.warm_cache)
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    print(f"{label:<24} {count:>6} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.2f} "
+                          f"{result['p99_ms']:>9.2f} {result['vault_calls_per_request']:>10.1f} {result['errors']:>7}")
+    finally:
+        vault.stop()
+        employee_app.db_pool.close()
+        if tmpdir:
+            tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
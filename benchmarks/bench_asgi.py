@@ -0,0 +1,150 @@
+# Concurrent load on the sync deployment (Flask app.run, threaded) versus the
+# async one (uvicorn asgi:application), both against the fake Vault and a local
+# Postgres that has the schema from the README. The fake Vault hands out
+# --db-user/--db-password as the dynamic credentials, so that role must exist.
+# Rows are appended, never deleted, so use a scratch database.
+#
+#   python benchmarks/bench_asgi.py --dsn-host localhost --rows 1000 --concurrency 1 16 64 --latency 0.005
+import argparse
+import asyncio
+import configparser
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, BENCH_DIR)
+
+import httpx  # noqa: E402
+
+from bench_app import percentile, seed  # noqa: E402
+from fake_vault import FakeVault  # noqa: E402
+import app as employee_app  # noqa: E402
+
+SERVERS = {
+    'sync (app.run)': [sys.executable, '-c',
+                       "import sys, app; app.create_app().run(port=int(sys.argv[1]), threaded=True)"],
+    'async (uvicorn)': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--no-access-log',
+                        '--log-level', 'warning', '--port'],
+}
+
+
+def write_config(workdir, args, vault):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(ROOT, 'config.ini'))
+    config['Vault']['vault_addr'] = vault.url
+    config['Vault']['masking'] = 'true'  # the fake Vault has Transform
+    config['Database'].update({'host': args.dsn_host, 'port': str(args.dsn_port), 'dbname': args.dsn_name,
+                               'pool_max': str(args.db_pool)})
+    config['Logging'].update({'level': 'WARNING', 'file': os.path.join(workdir, 'app.log')})
+    if not args.warm_cache:
+        # Every page view then goes to Vault, which is the I/O being compared
+        config['Cache']['decrypt_entries'] = '0'
+    with open(os.path.join(workdir, 'config.ini'), 'w') as f:
+        config.write(f)
+
+
+async def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(f"{url}/ready")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+async def load(url, paths, requests, concurrency):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(paths[i % len(paths)])
+
+    async def worker(client):
+        nonlocal errors
+        while True:
+            try:
+                path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                if path == '/':
+                    response = await client.post(path, data={
+                        'name': 'Bench', 'role': 'Engineer', 'email': 'bench@example.com',
+                        'phone': '5551234567', 'ssn': '123456789', 'address': '1 Bench St'})
+                    ok = 'message success' in response.text
+                else:
+                    response = await client.get(path)
+                    ok = 'message error' not in response.text
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += 0 if ok and response.status_code == 200 else 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return requests / elapsed, percentile(latencies, 0.50) * 1000, percentile(latencies, 0.99) * 1000, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync vs async deployment under concurrent load.')
+    parser.add_argument('--dsn-host', required=True, help='Postgres host with the employees schema')
+    parser.add_argument('--dsn-port', type=int, default=5432)
+    parser.add_argument('--dsn-name', default='employees')
+    parser.add_argument('--db-user', default='bench')
+    parser.add_argument('--db-password', default='bench')
+    parser.add_argument('--db-pool', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=1000, help='rows seeded and shown per page')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--latency', type=float, default=0.005, help='fake Vault latency per request (seconds)')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--warm-cache', action='store_true', help='let the servers cache decrypted values')
+    args = parser.parse_args()
+
+    vault = FakeVault(latency=args.latency, db_username=args.db_user, db_password=args.db_password).start()
+    employee_app.create_app({'VAULT_ADDR': vault.url, 'MASKING': True, 'LOG_FILE': '', 'LOG_LEVEL': 'WARNING',
+                             'DB_HOST': args.dsn_host, 'DB_PORT': args.dsn_port, 'DB_NAME': args.dsn_name})
+    start_after = seed(args.rows)
+    page = min(args.rows, employee_app.MAX_PAGE_SIZE)
+    operations = {
+        'view_employees': [f"/employees?after_id={start_after}&limit={page}"],
+        'view_encrypted': [f"/employees/encrypted?after_id={start_after}&limit={page}"],
+        'add_employee': ['/'],
+    }
+
+    print(f"fake Vault latency {args.latency * 1000:.1f} ms, {args.rows} rows")
+    print(f"{'server':<16} {'operation':<16} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as workdir:
+        write_config(workdir, args, vault)
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        for server, command in SERVERS.items():
+            process = subprocess.Popen(command + [str(args.port)], cwd=workdir, env=env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            url = f"http://127.0.0.1:{args.port}"
+            try:
+                asyncio.run(wait_until_up(url))
+                for name, paths in operations.items():
+                    for concurrency in args.concurrency:
+                        asyncio.run(load(url, paths, concurrency, concurrency))  # warm up
+                        rps, p50, p99, errors = asyncio.run(load(url, paths, args.requests, concurrency))
+                        print(f"{server:<16} {name:<16} {concurrency:>5} {rps:>9.1f} {p50:>9.2f} {p99:>9.2f} {errors:>7}")
+            finally:
+                process.terminate()
+                process.wait()
+    vault.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Caller-side cost of logging on a hot loop (one debug message per decrypted
+# cell): the old synchronous DEBUG FileHandler setup versus the QueueHandler
+# pipeline with redaction, at DEBUG with sampling and at the default INFO level.
+#
+#   python benchmarks/bench_logging.py --messages 20000
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as employee_app  # noqa: E402
+
+CIPHERTEXT = 'vault:v1:8SDd3WHDOjf7mq69CyCqYjBXAiQQAVZRkFM13ok481zoCmHnSeDX9vyf7w=='
+
+
+def reset_root(handlers, level):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+# The logging setup and message style used before the queue pipeline
+def run_before(messages, log_path, devnull):
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+    handlers = [logging.FileHandler(log_path), logging.StreamHandler(devnull)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    reset_root(handlers, logging.DEBUG)
+    logger = logging.getLogger('bench.before')
+    start = time.perf_counter()
+    for i in range(messages):
+        plaintext = f"employee{i}@example.com"
+        logger.debug(f"Decrypting data: {CIPHERTEXT}")
+        logger.debug(f"Decrypted data: {plaintext}")
+    elapsed = time.perf_counter() - start
+    for handler in handlers:
+        handler.close()
+    return elapsed, elapsed
+
+
+def run_after(messages, log_path, level):
+    employee_app.configure_logging(level=level, path=log_path)
+    logger = logging.getLogger('bench.after')
+    sampled = employee_app.SampledLogger(logger, interval=employee_app.LOG_DEBUG_SAMPLE_INTERVAL)
+    start = time.perf_counter()
+    for _ in range(messages):
+        sampled.debug('decrypt', "Decrypting data with key %s", employee_app.ENCRYPTION_KEY)
+    elapsed = time.perf_counter() - start
+    employee_app.stop_logging()  # waits for the queue to drain
+    return elapsed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        log_path = os.path.join(tmp, 'bench.log')
+        stderr = sys.stderr
+        sys.stderr = devnull  # keep console handlers quiet
+        try:
+            results = [
+                ('sync DEBUG (before)', run_before(args.messages, log_path, devnull)),
+                ('queue DEBUG sampled', run_after(args.messages, log_path, 'DEBUG')),
+                ('queue INFO', run_after(args.messages, log_path, 'INFO')),
+            ]
+        finally:
+            sys.stderr = stderr
+
+    print(f"{'setup':<22} {'caller us/cell':>15} {'incl. drain ms':>15}")
+    for name, (caller, total) in results:
+        print(f"{name:<22} {caller / args.messages * 1e6:>15.2f} {total * 1000:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
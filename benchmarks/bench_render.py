@@ -0,0 +1,72 @@
+# Per-request render cost of the employee table: the old approach (hand-built
+# HTML passed through render_template_string on every request) versus the
+# precompiled, autoescaping employee_table.html template.
+#
+#   python benchmarks/bench_render.py --rows 100 --iterations 200
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import render_template_string  # noqa: E402
+
+import app as employee_app  # noqa: E402
+
+HEADERS = list(employee_app.EMPLOYEE_COLUMNS)
+
+
+def make_rows(count):
+    return [
+        (i, f"Employee {i}", 'Engineer', f"employee{i}@example.com", '5551234567', '123456789', f"{i} Main St")
+        for i in range(1, count + 1)
+    ]
+
+
+# The render path used before templates were precompiled
+def render_before(rows):
+    content = '''
+    <h2>Employee Records</h2>
+    <div class="table-container">
+        <table>
+            <tr>{}</tr>
+            {}
+        </table>
+    </div>
+    '''.format(
+        ''.join([f'<th>{h}</th>' for h in HEADERS]),
+        ''.join(['<tr>' + ''.join([f'<td title="{str(col)}">{str(col)}</td>' for col in row]) + '</tr>' for row in rows])
+    )
+    return render_template_string(employee_app.base_template, content=content)
+
+
+def render_after(rows):
+    return employee_app.render_employee_table('Employee Records', HEADERS, rows)
+
+
+def measure(render, rows, iterations):
+    render(rows)  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        render(rows)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    with employee_app.app.test_request_context('/employees'):
+        print(f"{'rows':>8} {'before ms':>12} {'after ms':>12} {'speedup':>9}")
+        for count in args.rows:
+            rows = make_rows(count)
+            before = measure(render_before, rows, args.iterations)
+            after = measure(render_after, rows, args.iterations)
+            print(f"{count:>8} {before:>12.3f} {after:>12.3f} {before / after:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Cold start of a worker: a fresh interpreter importing app.py, building the
+# app and answering its first request, against a fake Vault with a given
+# latency. Before the app factory the import itself blocked on a Vault health
+# check; now the check runs in the background and only /ready reports it.
+#
+#   python benchmarks/bench_startup.py --latency 0 0.5 2 --runs 5
+import argparse
+import configparser
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, BENCH_DIR)
+
+from fake_vault import FakeVault  # noqa: E402
+
+WORKER = f'''
+import sys
+sys.path.insert(0, {ROOT!r})
+import app
+app.app.test_client().get('/ready')
+'''
+
+
+def cold_start(workdir):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', WORKER], cwd=workdir, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker cold start time against a slow Vault.')
+    parser.add_argument('--latency', type=float, nargs='+', default=[0.0, 0.5, 2.0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'vault latency s':>16} {'median s':>10} {'max s':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for latency in args.latency:
+            vault = FakeVault(latency=latency).start()
+            try:
+                config = configparser.ConfigParser()
+                config.read(os.path.join(ROOT, 'config.ini'))
+                config['Vault']['vault_addr'] = vault.url
+                config['Logging']['file'] = os.path.join(workdir, 'app.log')
+                with open(os.path.join(workdir, 'config.ini'), 'w') as f:
+                    config.write(f)
+                times = [cold_start(workdir) for _ in range(args.runs)]
+                print(f"{latency:>16.2f} {statistics.median(times):>10.3f} {max(times):>10.3f}")
+            finally:
+                vault.stop()
+
+
+if __name__ == '__main__':
+    main()
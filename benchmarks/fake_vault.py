@@ -0,0 +1,226 @@
+# In-process stub of the parts of the Vault HTTP API this app uses, for offline
+# benchmarks. Supports sys/health, database creds and lease renewal, transit
+# encrypt/decrypt/rewrap/datakey/hmac/keys (single and batch_input) and
+# transform encode/decode, with injectable latency and error rates.
+#
+# Ciphertexts are NOT secure: they are the base64 plaintext behind a
+# vault:v<version>: prefix, which is all a benchmark needs.
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # Clients that hang up early (timeouts, exiting workers) are expected
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeVault:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, item_error_rate=0.0,
+                 db_username='bench', db_password='bench', lease_duration=3600, key_version=1,
+                 min_decryption_version=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.item_error_rate = item_error_rate
+        self.db_username = db_username
+        self.db_password = db_password
+        self.lease_duration = lease_duration
+        self.key_version = key_version
+        self.min_decryption_version = min_decryption_version
+        self.requests = Counter()
+        self._hmac_secret = os.urandom(32)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host='127.0.0.1', port=0):
+        vault = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _respond(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+                status, payload = vault.handle(method, self.path.split('?', 1)[0], body)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def do_PUT(self):
+                self._respond('PUT')
+
+        self._server = QuietHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-vault', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+
+    # Route one request; returns (status, JSON payload)
+    def handle(self, method, path, body):
+        parts = path.strip('/').split('/')[1:]  # drop the v1 prefix
+        operation = self._operation(parts)
+        with self._lock:
+            self.requests[operation] += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        if operation != 'health' and random.random() < self.error_rate:
+            return 503, {'errors': ['injected failure']}
+        try:
+            handler = getattr(self, f"_{operation}", None)
+            if handler is None:
+                return 404, {'errors': [f"no handler for {path}"]}
+            return handler(parts, body)
+        except (KeyError, ValueError) as e:
+            return 400, {'errors': [str(e)]}
+
+    @staticmethod
+    def _operation(parts):
+        if parts[:2] == ['sys', 'health']:
+            return 'health'
+        if parts[:2] == ['sys', 'leases']:
+            return 'renew'
+        if len(parts) >= 3 and parts[-2] == 'creds':
+            return 'creds'
+        if parts and parts[0] == 'transit' and len(parts) >= 2:
+            return parts[1]
+        if parts and parts[0] == 'transform' and len(parts) >= 2:
+            return parts[1]
+        return 'unknown'
+
+    def _batch(self, body, item):
+        if 'batch_input' not in body:
+            return 200, {'data': item(body)}
+        results = []
+        failed = False
+        for entry in body['batch_input']:
+            if random.random() < self.item_error_rate:
+                results.append({'error': 'injected item failure'})
+                failed = True
+                continue
+            try:
+                results.append(item(entry))
+            except (KeyError, ValueError) as e:
+                results.append({'error': str(e)})
+                failed = True
+        return (400 if failed else 200), {'data': {'batch_results': results}}
+
+    def _seal(self, b64):
+        return f"vault:v{self.key_version}:{b64}"
+
+    @staticmethod
+    def _open(ciphertext):
+        prefix, version, b64 = ciphertext.split(':', 2)
+        if prefix != 'vault' or not version.startswith('v'):
+            raise ValueError('invalid ciphertext')
+        base64.b64decode(b64, validate=True)
+        return b64
+
+    def _health(self, parts, body):
+        return 200, {'initialized': True, 'sealed': False, 'standby': False}
+
+    def _creds(self, parts, body):
+        return 200, {
+            'lease_id': f"{'/'.join(parts)}/{os.urandom(6).hex()}",
+            'lease_duration': self.lease_duration,
+            'renewable': True,
+            'data': {'username': self.db_username, 'password': self.db_password},
+        }
+
+    def _renew(self, parts, body):
+        return 200, {'lease_id': body.get('lease_id'), 'lease_duration': self.lease_duration, 'renewable': True}
+
+    def _keys(self, parts, body):
+        return 200, {'data': {'name': parts[2], 'latest_version': self.key_version,
+                              'min_decryption_version': self.min_decryption_version}}
+
+    def _encrypt(self, parts, body):
+        return self._batch(body, lambda item: {'ciphertext': self._seal(item['plaintext']), 'key_version': self.key_version})
+
+    def _decrypt(self, parts, body):
+        return self._batch(body, lambda item: {'plaintext': self._open(item['ciphertext'])})
+
+    def _rewrap(self, parts, body):
+        return self._batch(body, lambda item: {'ciphertext': self._seal(self._open(item['ciphertext'])),
+                                               'key_version': self.key_version})
+
+    def _datakey(self, parts, body):
+        key = base64.b64encode(os.urandom(int(body.get('bits', 256)) // 8)).decode('utf-8')
+        data = {'ciphertext': self._seal(key), 'key_version': self.key_version}
+        if parts[2] == 'plaintext':
+            data['plaintext'] = key
+        return 200, {'data': data}
+
+    def _hmac(self, parts, body):
+        def item(entry):
+            digest = hmac.new(self._hmac_secret, base64.b64decode(entry['input']), hashlib.sha256).digest()
+            return {'hmac': f"vault:v1:{base64.b64encode(digest).decode('utf-8')}"}
+        return self._batch(body, item)
+
+    # Format-preserving "encryption" stand-in: reverses the digits
+    def _encode(self, parts, body):
+        return self._batch(body, lambda item: {'encoded_value': item['value'][::-1]})
+
+    def _decode(self, parts, body):
+        decode_format = parts[3] if len(parts) > 3 else 'full'
+
+        def item(entry):
+            value = entry['value'][::-1]
+            return {'decoded_value': value[-4:] if decode_format == 'last-four' else value}
+        return self._batch(body, item)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run the fake Vault server in the foreground.')
+    parser.add_argument('--port', type=int, default=8200)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    vault = FakeVault(latency=args.latency, error_rate=args.error_rate).start(port=args.port)
+    print(f"Fake Vault listening on {vault.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        vault.stop()